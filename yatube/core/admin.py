@@ -0,0 +1,175 @@
+"""Списки админки для больших таблиц.
+
+EstimatedCountPaginator не считает все строки, IndexedDatesQuerySet
+строит date_hierarchy поиском диапазонов по индексу, а
+autocomplete_filter фильтрует по связи полем автодополнения вместо
+списка всех связанных объектов. ScalableAdminMixin собирает это
+вместе для ModelAdmin.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, models
+from django.db.models import Max, Min
+from django.forms import ModelChoiceField
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+def table_estimate(model, using):
+    """Число строк таблицы из статистики ANALYZE или по наибольшему id."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s '
+                               'LIMIT 1', [model._meta.db_table])
+                row = cursor.fetchone()
+        except DatabaseError:
+            row = None
+        if row:
+            return int(row[0].split()[0])
+    return model._default_manager.using(using).aggregate(
+        last=Max('pk')
+    )['last'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator списка без COUNT(*) по всей таблице.
+
+    Без фильтров число строк оценивается, с фильтрами строки
+    считаются не дальше ADMIN_EXACT_COUNT_LIMIT.
+    """
+
+    @cached_property
+    def count(self):
+        rows = self.object_list
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        if not rows.query.where:
+            estimate = table_estimate(rows.model, rows.db)
+            if estimate > limit:
+                return estimate
+        return rows.order_by()[:limit].count()
+
+
+def period_starts(first, last, kind):
+    """Начала лет или месяцев от first до last включительно."""
+    year, month = first.year, first.month if kind == 'month' else 1
+    while (year, month) <= (last.year, last.month):
+        yield datetime(year, month, 1)
+        if kind == 'year':
+            year += 1
+        else:
+            year, month = year + month // 12, month % 12 + 1
+
+
+class IndexedDatesQuerySet(models.QuerySet):
+    """dates() для date_hierarchy без просмотра всей таблицы.
+
+    Годы и месяцы между первой и последней датой проверяются
+    exists() по диапазону: это поиск по индексу поля даты.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in ('year', 'month'):
+            return super().dates(field_name, kind, order)
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        first, last = bounds['first'], bounds['last']
+        if settings.USE_TZ:
+            first, last = timezone.localtime(first), timezone.localtime(last)
+        starts = list(period_starts(first, last, kind))
+        found = []
+        for start, end in zip(starts, starts[1:] + [None]):
+            rows = self.filter(**{f'{field_name}__gte': self.aware(start)})
+            if end is not None:
+                rows = rows.filter(**{f'{field_name}__lt': self.aware(end)})
+            if rows.exists():
+                found.append(start.date())
+        return found[::-1] if order == 'DESC' else found
+
+    def aware(self, value):
+        return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+class IndexedDatesMixin:
+    """Список админки на IndexedDatesQuerySet."""
+
+    def get_queryset(self, request):
+        rows = super().get_queryset(request)
+        return IndexedDatesQuerySet(rows.model, rows.query.chain(),
+                                    rows._db, rows._hints)
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """Фильтр по связи полем автодополнения админки.
+
+    Связанная модель должна быть в админке с search_fields.
+    """
+    template = 'admin/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.parameter_name = f'{self.field_name}__id__exact'
+        super().__init__(request, params, model, model_admin)
+        field = self.widget_field(model, model_admin.admin_site)
+        self.rendered_widget = field.widget.render(self.parameter_name,
+                                                   self.value())
+
+    @classmethod
+    def widget_field(cls, model, admin_site):
+        remote_field = model._meta.get_field(cls.field_name).remote_field
+        return ModelChoiceField(
+            queryset=remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(remote_field, admin_site),
+            required=False
+        )
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+
+def autocomplete_filter(field_name, title):
+    return type(f'{field_name.title()}Filter', (AutocompleteFilter,),
+                {'field_name': field_name, 'title': title})
+
+
+class ScalableAdminMixin:
+    """Список без полных COUNT(*) и запросов на каждую строку.
+
+    Варианты выбора связей из list_editable загружаются одним
+    запросом на страницу и общие для всех строк; iter() — чтобы
+    list() не спрашивал у вариантов len() отдельным COUNT(*).
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist_formset(self, request, **kwargs):
+        formset = super().get_changelist_formset(request, **kwargs)
+        for name in self.list_editable:
+            field = formset.form.base_fields.get(name)
+            if isinstance(field, ModelChoiceField):
+                field.choices = list(iter(field.choices))
+        return formset
+
+    @property
+    def media(self):
+        media = super().media
+        for spec in self.list_filter:
+            if isinstance(spec, type) and issubclass(spec,
+                                                     AutocompleteFilter):
+                media += spec.widget_field(self.model,
+                                           self.admin_site).widget.media
+        return media
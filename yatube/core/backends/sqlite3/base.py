@@ -0,0 +1,143 @@
+"""SQLite для нескольких воркеров: WAL, mmap и сериализация записи.
+
+Прагмы задаются в OPTIONS['pragmas'] и выполняются на каждом новом
+соединении поверх DEFAULT_PRAGMAS. OPTIONS['transaction_mode']
+('DEFERRED', 'IMMEDIATE' или 'EXCLUSIVE') задаёт, как начинаются
+транзакции atomic. С OPTIONS['serialize_writes'] потоки процесса
+пишут по очереди: транзакция atomic и одиночная запись вне неё
+берут общую для файла базы блокировку, поэтому потоки не толкаются
+за блокировку SQLite и не ждут в её busy-цикле.
+"""
+import threading
+from collections import defaultdict
+from contextlib import nullcontext
+
+from django.db.backends.sqlite3 import base
+
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+write_locks = defaultdict(threading.Lock)
+write_locks_guard = threading.Lock()
+
+
+def write_lock(name):
+    with write_locks_guard:
+        return write_locks[name]
+
+
+def is_write(query):
+    return query.lstrip()[:7].upper().startswith(WRITE_STATEMENTS)
+
+
+class SerializedCursorWrapper(base.SQLiteCursorWrapper):
+    """Одиночные записи в режиме autocommit ждут общей блокировки."""
+
+    wrapper = None
+
+    def execute(self, query, params=None):
+        with self.wrapper.serialized(query):
+            return super().execute(query, params)
+
+    def executemany(self, query, param_list):
+        with self.wrapper.serialized(query):
+            return super().executemany(query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        self.transaction_mode = options.get('transaction_mode', 'DEFERRED')
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ValueError(
+                f'transaction_mode: {self.transaction_mode}, '
+                f'ожидается одно из {", ".join(TRANSACTION_MODES)}'
+            )
+        self.write_lock = None
+        if options.get('serialize_writes'):
+            self.write_lock = write_lock(self.settings_dict['NAME'])
+        self.holds_write_lock = False
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        for option in ('pragmas', 'transaction_mode', 'serialize_writes'):
+            kwargs.pop(option, None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for pragma, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        return conn
+
+    @property
+    def foreign_keys_off(self):
+        """Связи ведут в другие базы (шарды): SQLite их не проверяет."""
+        return str(self.pragmas.get('foreign_keys', 'ON')).upper() == 'OFF'
+
+    def check_constraints(self, table_names=None):
+        if not self.foreign_keys_off:
+            super().check_constraints(table_names)
+
+    def enable_constraint_checking(self):
+        if not self.foreign_keys_off:
+            super().enable_constraint_checking()
+
+    def create_cursor(self, name=None):
+        if self.write_lock is None:
+            return super().create_cursor(name)
+        cursor = self.connection.cursor(factory=SerializedCursorWrapper)
+        cursor.wrapper = self
+        return cursor
+
+    def serialized(self, query):
+        """Блокировка на одну запись вне транзакции, иначе ничего."""
+        if self.holds_write_lock or not is_write(query):
+            return nullcontext()
+        return self.write_lock
+
+    def acquire_write_lock(self):
+        if self.write_lock is not None and not self.holds_write_lock:
+            self.write_lock.acquire()
+            self.holds_write_lock = True
+
+    def release_write_lock(self):
+        if self.holds_write_lock:
+            self.holds_write_lock = False
+            self.write_lock.release()
+
+    def _start_transaction_under_autocommit(self):
+        self.acquire_write_lock()
+        try:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        except Exception:
+            self.release_write_lock()
+            raise
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.release_write_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_write_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_write_lock()
@@ -0,0 +1,239 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+SCHEMA = (
+    'PRAGMA journal_mode=WAL',
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL,'
+    ' accessed REAL NOT NULL, size INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS cache_size ('
+    ' total INTEGER NOT NULL, entries INTEGER NOT NULL)',
+    'INSERT INTO cache_size SELECT 0, 0 WHERE NOT EXISTS'
+    ' (SELECT 1 FROM cache_size)',
+    'CREATE TRIGGER IF NOT EXISTS cache_inserted AFTER INSERT ON cache'
+    ' BEGIN UPDATE cache_size SET total = total + new.size,'
+    ' entries = entries + 1; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_updated AFTER UPDATE OF size'
+    ' ON cache BEGIN'
+    ' UPDATE cache_size SET total = total + new.size - old.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_deleted AFTER DELETE ON cache'
+    ' BEGIN UPDATE cache_size SET total = total - old.size,'
+    ' entries = entries - 1; END',
+)
+UPSERT = (
+    'INSERT INTO cache (key, value, expires, accessed, size)'
+    ' VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET'
+    ' value = excluded.value, expires = excluded.expires,'
+    ' accessed = excluded.accessed, size = excluded.size'
+)
+
+
+def encode(value):
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def decode(value):
+    return pickle.loads(value)
+
+
+def stored_size(key, value):
+    return len(key) + len(value)
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite в режиме WAL, общий для процессов одного хоста.
+
+    Чтение не блокирует запись, а запись каждого процесса занимает
+    одну короткую транзакцию с блокировкой с самого начала, поэтому
+    add, incr и decr атомарны между процессами. При превышении
+    MAX_SIZE байт или MAX_ENTRIES записей вытесняются давно не
+    читавшиеся ключи (LRU). Время чтения обновляется не чаще раза
+    в ACCESS_RESOLUTION секунд, чтобы чтения не превращались в запись.
+
+    OPTIONS: MAX_SIZE, MAX_ENTRIES, CULL_FREQUENCY (как у LocMemCache),
+    ACCESS_RESOLUTION и BUSY_TIMEOUT в секундах.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self.access_resolution = float(options.get('ACCESS_RESOLUTION', 1))
+        self.busy_timeout = float(options.get('BUSY_TIMEOUT', 10))
+        self.local = threading.local()
+
+    @property
+    def db(self):
+        """Своё соединение у каждого потока; после fork — новое."""
+        db = getattr(self.local, 'db', None)
+        if db is None or self.local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                 isolation_level=None)
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self.local.db, self.local.pid = db, os.getpid()
+        return db
+
+    def write(self):
+        """Транзакция с блокировкой записи с самого начала."""
+        return Transaction(self.db)
+
+    def key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def touch_rows(self, rows, now):
+        """Обновляет время чтения у давно не читавшихся ключей."""
+        stale = [key for key, accessed in rows
+                 if now - accessed >= self.access_resolution]
+        if stale:
+            self.db.executemany('UPDATE cache SET accessed = ? WHERE key = ?',
+                                [(now, key) for key in stale])
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self.key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        rows = self.db.execute(
+            f'SELECT key, value, accessed FROM cache WHERE key IN '
+            f'({placeholders}) AND (expires IS NULL OR expires > ?)',
+            [*keys, now]
+        ).fetchall()
+        self.touch_rows([(key, accessed) for key, _, accessed in rows], now)
+        return {keys[key]: decode(value) for key, value, _ in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now, expires = time.time(), self.get_backend_timeout(timeout)
+        rows = []
+        for key, value in data.items():
+            key, value = self.key(key, version), encode(value)
+            rows.append((key, value, expires, now,
+                         stored_size(key, value)))
+        with self.write() as db:
+            db.executemany(UPSERT, rows)
+            self.cull(db)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Записывает ключ, только если его нет или он истёк."""
+        now, key, value = time.time(), self.key(key, version), encode(value)
+        with self.write() as db:
+            added = db.execute(
+                f'{UPSERT} WHERE cache.expires IS NOT NULL '
+                f'AND cache.expires <= ?',
+                (key, value, self.get_backend_timeout(timeout), now,
+                 stored_size(key, value), now)
+            ).rowcount
+            if added:
+                self.cull(db)
+        return bool(added)
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно прибавляет delta; ValueError, если ключа нет."""
+        key = self.key(key, version)
+        with self.write() as db:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = decode(row[0]) + delta
+            stored = encode(value)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (stored, stored_size(key, stored), key)
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        with self.write() as db:
+            return bool(db.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), self.key(key, version),
+                 time.time())
+            ).rowcount)
+
+    def has_key(self, key, version=None):
+        return self.db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.key(key, version), time.time())
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [(self.key(key, version),) for key in keys]
+        with self.write() as db:
+            db.executemany('DELETE FROM cache WHERE key = ?', keys)
+
+    def clear(self):
+        with self.write() as db:
+            db.execute('DELETE FROM cache')
+
+    def cull(self, db):
+        """Удаляет истёкшие ключи, затем самые давно читавшиеся.
+
+        Вытесняется 1/CULL_FREQUENCY записей за раз, пока кэш не
+        уложится в MAX_SIZE и MAX_ENTRIES.
+        """
+        if self.fits(db):
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        while not self.fits(db):
+            count = db.execute('SELECT entries FROM cache_size').fetchone()[0]
+            if not self._cull_frequency:
+                db.execute('DELETE FROM cache')
+                return
+            db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)',
+                (max(count // self._cull_frequency, 1),)
+            )
+
+    def fits(self, db):
+        total, count = db.execute(
+            'SELECT total, entries FROM cache_size'
+        ).fetchone()
+        return total <= self.max_size and count <= self._max_entries
+
+    def close(self, **kwargs):
+        """Соединения живут всё время работы потока: открывать их дорого."""
+
+
+class Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, при исключении — ROLLBACK."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        return self.db
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
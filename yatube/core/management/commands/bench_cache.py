@@ -0,0 +1,124 @@
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'sqlite': 'core.cache.SQLiteCache',
+}
+COUNTER_KEY = 'bench:counter'
+WORKLOAD = ('operations', 'keys', 'value_size', 'render_ms', 'incr_every')
+
+
+def run_worker(backend, location, workload, seed):
+    """Нагрузка одного процесса: чтения с записью при промахе и счётчик.
+
+    На промахе процесс «рисует» фрагмент render_ms миллисекунд
+    и кладёт его в кэш, каждая incr_every-я операция — incr.
+    """
+    cache = import_string(BACKENDS[backend])(location, {
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': workload['keys'] * 2},
+    })
+    rng = random.Random(seed)
+    value = 'x' * workload['value_size']
+    hits = misses = increments = 0
+    cache.add(COUNTER_KEY, 0, None)
+    start = time.perf_counter()
+    for number in range(workload['operations']):
+        if number % workload['incr_every'] == 0:
+            cache.incr(COUNTER_KEY)
+            increments += 1
+            continue
+        key = f'bench:{int(workload["keys"] * rng.random() ** 2)}'
+        if cache.get(key) is None:
+            misses += 1
+            time.sleep(workload['render_ms'] / 1000)
+            cache.set(key, value)
+        else:
+            hits += 1
+    elapsed = time.perf_counter() - start
+    return {
+        'hits': hits,
+        'misses': misses,
+        'increments': increments,
+        'counter': cache.get(COUNTER_KEY),
+        'elapsed': elapsed,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест кэша из нескольких процессов: пропускная '
+            'способность, доля попаданий и согласованность счётчика '
+            'для LocMemCache и общего SQLiteCache.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', choices=BACKENDS,
+                            default=list(BACKENDS))
+        parser.add_argument('--workers', nargs='+', type=int,
+                            default=[1, 2, 4, 8])
+        parser.add_argument('--operations', type=int, default=5000,
+                            help='Операций на процесс')
+        parser.add_argument('--keys', type=int, default=2000,
+                            help='Размер пространства ключей')
+        parser.add_argument('--value-size', type=int, default=4096,
+                            help='Размер значения в байтах')
+        parser.add_argument('--render-ms', type=float, default=1,
+                            help='Цена промаха в миллисекундах')
+        parser.add_argument('--incr-every', type=int, default=20,
+                            help='Каждая N-я операция — incr счётчика')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        results = {}
+        for backend in options['backends']:
+            for workers in options['workers']:
+                name = f'{backend}:{workers}'
+                results[name] = self.measure(backend, workers, options)
+                self.report(name, results[name])
+        if options['output']:
+            report = {
+                'created': timezone.now().isoformat(),
+                'operations': options['operations'],
+                'keys': options['keys'],
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+
+    def measure(self, backend, workers, options):
+        """Каждый замер начинается с пустого кэша в новом файле."""
+        workload = {name: options[name] for name in WORKLOAD}
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, 'cache.sqlite3')
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                batches = list(executor.map(
+                    run_worker, [backend] * workers, [location] * workers,
+                    [workload] * workers, range(workers)
+                ))
+        hits = sum(batch['hits'] for batch in batches)
+        misses = sum(batch['misses'] for batch in batches)
+        increments = sum(batch['increments'] for batch in batches)
+        operations = hits + misses + increments
+        return {
+            'ops': round(operations
+                         / max(batch['elapsed'] for batch in batches), 1),
+            'hit_rate': round(hits / max(hits + misses, 1), 3),
+            'counter': max(batch['counter'] for batch in batches),
+            'increments': increments,
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name}: {result["ops"]} оп/с, попаданий '
+            f'{result["hit_rate"]:.1%}, счётчик {result["counter"]} '
+            f'из {result["increments"]}'
+        )
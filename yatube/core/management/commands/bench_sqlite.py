@@ -0,0 +1,152 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+
+CONFIGS = {
+    'stock': {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}},
+    'tuned': {
+        'ENGINE': 'core.backends.sqlite3',
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+    },
+    'serialized': {
+        'ENGINE': 'core.backends.sqlite3',
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE',
+                    'serialize_writes': True},
+    },
+}
+SCHEMA = (
+    'CREATE TABLE bench_post (id INTEGER PRIMARY KEY, text TEXT,'
+    ' comments_count INTEGER NOT NULL DEFAULT 0)',
+    'CREATE TABLE bench_comment (id INTEGER PRIMARY KEY,'
+    ' post_id INTEGER NOT NULL, text TEXT)',
+    'CREATE INDEX bench_comment_post ON bench_comment (post_id, id)',
+)
+
+
+def create_database(path, posts):
+    """Свежий файл в режиме rollback journal, как у новой базы."""
+    db = sqlite3.connect(path)
+    for statement in SCHEMA:
+        db.execute(statement)
+    db.executemany('INSERT INTO bench_post (text) VALUES (?)',
+                   [('Пост ' * 20,)] * posts)
+    db.commit()
+    db.close()
+
+
+def read(alias, rng, posts):
+    """Как страница поста: лента постов и комментарии одного из них."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT id, text, comments_count FROM bench_post '
+                       'ORDER BY id DESC LIMIT 10')
+        cursor.fetchall()
+        cursor.execute('SELECT text FROM bench_comment WHERE post_id = %s '
+                       'ORDER BY id DESC LIMIT 10', [rng.randint(1, posts)])
+        cursor.fetchall()
+
+
+def write(alias, rng, posts):
+    """Как add_comment: комментарий и счётчик поста в одной транзакции."""
+    post_id = rng.randint(1, posts)
+    with transaction.atomic(using=alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT comments_count FROM bench_post '
+                           'WHERE id = %s', [post_id])
+            count = cursor.fetchone()[0]
+            cursor.execute('INSERT INTO bench_comment (post_id, text) '
+                           'VALUES (%s, %s)', [post_id, 'Комментарий'])
+            cursor.execute('UPDATE bench_post SET comments_count = %s '
+                           'WHERE id = %s', [count + 1, post_id])
+
+
+def worker(operation, alias, deadline, posts, seed, totals, lock):
+    rng = random.Random(seed)
+    done = errors = 0
+    try:
+        while time.perf_counter() < deadline:
+            try:
+                operation(alias, rng, posts)
+                done += 1
+            except DatabaseError:
+                errors += 1
+    finally:
+        connections[alias].close()
+    with lock:
+        totals[operation.__name__] += done
+        totals['errors'] += errors
+
+
+class Command(BaseCommand):
+    help = ('Измеряет чтения и записи в секунду при одновременной '
+            'работе потоков для стандартного бэкенда SQLite и '
+            'core.backends.sqlite3 с прагмами и сериализацией записи.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--configs', nargs='+', choices=CONFIGS,
+                            default=list(CONFIGS))
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=3)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        results = {}
+        for name in options['configs']:
+            results[name] = self.measure(name, options)
+            result = results[name]
+            self.stdout.write(
+                f'{name}: чтений {result["reads"]}/с, записей '
+                f'{result["writes"]}/с, ошибок {result["errors"]}'
+            )
+        if options['output']:
+            report = {
+                'created': timezone.now().isoformat(),
+                'readers': options['readers'],
+                'writers': options['writers'],
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+
+    def measure(self, name, options):
+        """Свой файл и свой псевдоним соединения на каждый вариант."""
+        alias = f'bench_{name}'
+        totals = {'read': 0, 'write': 0, 'errors': 0}
+        lock = threading.Lock()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.sqlite3')
+            create_database(path, options['posts'])
+            connections.databases[alias] = {**CONFIGS[name], 'NAME': path}
+            try:
+                deadline = time.perf_counter() + options['seconds']
+                threads = [
+                    threading.Thread(target=worker, args=(
+                        operation, alias, deadline, options['posts'],
+                        seed, totals, lock
+                    ))
+                    for seed, operation in enumerate(
+                        [read] * options['readers']
+                        + [write] * options['writers']
+                    )
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            finally:
+                del connections.databases[alias]
+        return {
+            'reads': round(totals['read'] / options['seconds'], 1),
+            'writes': round(totals['write'] / options['seconds'], 1),
+            'errors': totals['errors'],
+        }
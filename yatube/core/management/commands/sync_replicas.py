@@ -0,0 +1,58 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import routers
+
+
+def replicate(source, target, pages):
+    """Копирует базу через backup API SQLite, возвращает время снимка."""
+    synced_at = time.time()
+    primary = sqlite3.connect(source, uri=True)
+    replica = sqlite3.connect(target, uri=True)
+    try:
+        primary.backup(replica, pages=pages)
+    finally:
+        replica.close()
+        primary.close()
+    return synced_at
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в реплики из REPLICA_DATABASES '
+            'и отмечает время синхронизации для роутера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд; 0 — один раз'
+        )
+        parser.add_argument(
+            '--pages', type=int, default=1024,
+            help='Страниц за шаг копирования: между шагами пишут другие'
+        )
+
+    def handle(self, *args, **options):
+        source = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+        for alias in settings.REPLICA_DATABASES:
+            if connections[alias].settings_dict['NAME'] == source:
+                raise CommandError(f'{alias} указывает на основную базу')
+        while True:
+            for alias in settings.REPLICA_DATABASES:
+                self.sync(alias, source, options['pages'])
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def sync(self, alias, source, pages):
+        start = time.perf_counter()
+        synced_at = replicate(
+            source, connections[alias].settings_dict['NAME'], pages
+        )
+        connections[alias].close()
+        routers.mark_synced(alias, synced_at)
+        self.stdout.write(f'{alias}: скопировано за '
+                          f'{time.perf_counter() - start:.2f} с')
@@ -0,0 +1,259 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.template.base import Template
+
+from . import routers
+
+
+logger = logging.getLogger(__name__)
+local = threading.local()
+MISSING = object()
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление сделало больше запросов, чем разрешено бюджетом."""
+
+
+def current_profile():
+    return getattr(local, 'profile', None)
+
+
+class RequestProfile:
+    """Счётчики одного запроса: SQL, шаблоны и кэш."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.shapes = Counter()
+        self.rendering = False
+        self.in_cache = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.shapes[context['connection'].alias, sql] += 1
+
+    def count_cache(self, hits, misses):
+        self.cache_hits += hits
+        self.cache_misses += misses
+
+    def repeated(self, limit):
+        """Формы запросов, выполненные не меньше limit раз (признак N+1).
+
+        Один запрос к разным базам (опрос шардов) повтором не считается.
+        """
+        return [(sql, count) for (_, sql), count in self.shapes.most_common()
+                if count >= limit]
+
+    def server_timing(self, total):
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits {self.cache_misses} misses"',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+
+def instrument_templates():
+    """Считает время отрисовки шаблонов; вложенные include не суммируются."""
+    render = Template.render
+    if getattr(render, 'profiled', False):
+        return
+
+    @wraps(render)
+    def profiled_render(self, context):
+        profile = current_profile()
+        if profile is None or profile.rendering:
+            return render(self, context)
+        profile.rendering = True
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.template_time += time.perf_counter() - start
+            profile.rendering = False
+
+    profiled_render.profiled = True
+    Template.render = profiled_render
+
+
+def quiet(method):
+    """Обращения к кэшу изнутри method не попадают в счётчики."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profile = current_profile()
+        if profile is None or profile.in_cache:
+            return method(self, *args, **kwargs)
+        profile.in_cache = True
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            profile.in_cache = False
+    return wrapper
+
+
+def instrument_cache(backend):
+    """Считает попадания и промахи get и get_many класса кэша."""
+    get, get_many = backend.get, backend.get_many
+    if getattr(get, 'profiled', False):
+        return
+
+    @wraps(get)
+    def profiled_get(self, key, default=None, version=None):
+        profile = current_profile()
+        if profile is None or profile.in_cache:
+            return get(self, key, default, version)
+        value = quiet(get)(self, key, MISSING, version)
+        profile.count_cache(value is not MISSING, value is MISSING)
+        return default if value is MISSING else value
+
+    @wraps(get_many)
+    def profiled_get_many(self, keys, version=None):
+        profile = current_profile()
+        if profile is None or profile.in_cache:
+            return get_many(self, keys, version)
+        keys = list(keys)
+        found = quiet(get_many)(self, keys, version)
+        profile.count_cache(len(found), len(keys) - len(found))
+        return found
+
+    profiled_get.profiled = True
+    backend.get = profiled_get
+    backend.get_many = profiled_get_many
+    backend.incr = quiet(backend.incr)
+    backend.decr = quiet(backend.decr)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return request.path
+    return match.view_name
+
+
+class QueryInspectorMiddleware:
+    """Считает SQL, время базы, шаблонов и кэш каждого запроса.
+
+    Итог отдаётся в заголовке Server-Timing. Повторяющиеся формы
+    запросов попадают в лог как N+1, а превышение QUERY_BUDGETS
+    в режиме QUERY_BUDGET_STRICT поднимает QueryBudgetExceeded.
+    Бюджет задаётся для метода и представления, «GET posts:index»,
+    и действует при том числе шардов постов, на котором снят:
+    с шардами ленты опрашивают каждый из них.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_templates()
+        for alias in settings.CACHES:
+            instrument_cache(type(caches[alias]))
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        request.profile = local.profile = profile
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            local.profile = None
+        response['Server-Timing'] = profile.server_timing(
+            time.perf_counter() - start
+        )
+        self.check(view_name(request), profile, request.method)
+        return response
+
+    def check(self, view, profile, method='GET'):
+        for sql, count in profile.repeated(settings.QUERY_REPEAT_LIMIT):
+            logger.warning('Возможный N+1 в %s: %s раз %s', view, count, sql)
+        if len(settings.POST_SHARDS) != settings.QUERY_BUDGET_SHARDS:
+            return
+        route = f'{method} {view}'
+        budget = settings.QUERY_BUDGETS.get(route)
+        if budget is None or profile.queries <= budget:
+            return
+        message = (f'{route}: {profile.queries} запросов '
+                   f'при бюджете {budget}')
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class WriteDetector:
+    """Замечает изменяющие запросы к основной базе."""
+
+    def __init__(self):
+        self.seen = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if not self.seen:
+            self.seen = sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS)
+        return execute(sql, params, many, context)
+
+
+def pinned(request):
+    """Пользователь недавно писал и должен читать свои записи."""
+    try:
+        until = float(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0))
+    except ValueError:
+        return False
+    return until > time.time()
+
+
+class ReplicaMiddleware:
+    """Направляет чтения страниц из REPLICA_VIEW_MODULES на реплики.
+
+    Реплика выбирается только для безопасных методов. Запрос, который
+    что-то записал в основную базу, ставит cookie REPLICA_PIN_COOKIE:
+    следующие REPLICA_PIN_SECONDS секунд, но не меньше REPLICA_MAX_LAG,
+    этот пользователь читает с основной базы и видит свои изменения.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = WriteDetector()
+        try:
+            with connections[DEFAULT_DB_ALIAS].execute_wrapper(writes):
+                response = self.get_response(request)
+        finally:
+            routers.use_replica(None)
+        if writes.seen:
+            seconds = max(settings.REPLICA_PIN_SECONDS,
+                          settings.REPLICA_MAX_LAG)
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, str(time.time() + seconds),
+                max_age=seconds, httponly=True
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (view_func.__module__ not in settings.REPLICA_VIEW_MODULES
+                or request.method not in SAFE_METHODS):
+            return None
+        view = view_name(request)
+        if pinned(request):
+            logger.info('%s: чтение с основной базы после записи', view)
+        else:
+            routers.use_replica(routers.choose_replica(view))
+        return None
@@ -0,0 +1,85 @@
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+
+logger = logging.getLogger(__name__)
+local = threading.local()
+SYNCED_KEY = 'replica:synced:{}'
+
+
+def replica_lags(aliases):
+    """Отставание реплик в секундах; несинхронизированных нет в ответе."""
+    synced = cache.get_many([SYNCED_KEY.format(alias) for alias in aliases])
+    now = time.time()
+    return {alias: now - synced[SYNCED_KEY.format(alias)]
+            for alias in aliases if SYNCED_KEY.format(alias) in synced}
+
+
+def mark_synced(alias, synced_at):
+    cache.set(SYNCED_KEY.format(alias), synced_at, None)
+
+
+def choose_replica(view):
+    """Случайная реплика с допустимым отставанием или None."""
+    lags = replica_lags(settings.REPLICA_DATABASES)
+    fresh = []
+    for alias, lag in lags.items():
+        if lag > settings.REPLICA_MAX_LAG:
+            logger.warning('Реплика %s отстаёт на %.1f с', alias, lag)
+        else:
+            fresh.append(alias)
+    if not fresh:
+        logger.info('%s: чтение с основной базы, нет свежих реплик', view)
+        return None
+    alias = random.choice(fresh)
+    logger.info('%s: чтение с реплики %s, отставание %.1f с',
+                view, alias, lags[alias])
+    return alias
+
+
+def use_replica(alias):
+    local.replica = alias
+
+
+def read_changes_since(changed_at):
+    """Переводит чтение на основную базу, если реплика снята раньше.
+
+    changed_at — время последнего изменения данных страницы в секундах.
+    Страницу из такой реплики закэшировали бы под новой версией.
+    """
+    alias = getattr(local, 'replica', None)
+    if alias is None:
+        return
+    synced_at = cache.get(SYNCED_KEY.format(alias), 0)
+    if synced_at < changed_at:
+        logger.info('Реплика %s снята до изменений страницы', alias)
+        use_replica(None)
+
+
+class ReplicaRouter:
+    """Чтения запроса — с выбранной реплики, запись — в основную базу.
+
+    Реплику для запроса выбирает ReplicaMiddleware. Без неё чтение
+    идёт в основную базу, даже по связи объекта из другой базы.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in settings.REPLICA_PRIMARY_APPS:
+            return None
+        return getattr(local, 'replica', None) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Реплики получают схему вместе с копией основной базы."""
+        return db == DEFAULT_DB_ALIAS
@@ -1,4 +1,33 @@
-from django.test import TestCase
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import follow_graph
+from posts.models import Post
+
+from . import routers
+from .backends.sqlite3.base import DEFAULT_PRAGMAS
+from .cache import SQLiteCache
+from .middleware import (QueryBudgetExceeded, QueryInspectorMiddleware,
+                         RequestProfile)
+
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +35,357 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class QueryInspectorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Rin')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get('/')
+        self.assertRegex(
+            response['Server-Timing'],
+            r'db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, '
+            r'cache;desc="\d+ hits \d+ misses", total;dur=[\d.]+'
+        )
+
+    def test_queries_do_not_grow_with_page(self):
+        Post.objects.create(text='Пост', author=self.user)
+        single = self.client.get('/').wsgi_request.profile.queries
+        cache.clear()
+        for number in range(9):
+            Post.objects.create(text=f'Пост {number}', author=self.user)
+        self.assertEqual(self.client.get('/').wsgi_request.profile.queries,
+                         single)
+
+    def test_repeated_queries_are_logged(self):
+        profile = RequestProfile()
+        profile.shapes.update(
+            [('default', 'SELECT 1')] * 3
+            + [(alias, 'SELECT 2') for alias in ('default', 'a', 'b')]
+        )
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            QueryInspectorMiddleware(None).check('posts:index', profile)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('posts:index', logs.output[0])
+
+    @override_settings(QUERY_BUDGETS={'GET posts:index': 0},
+                       QUERY_BUDGET_STRICT=True)
+    def test_strict_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/')
+
+    @override_settings(QUERY_BUDGETS={'GET posts:index': 0})
+    def test_budget_is_logged(self):
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.assertEqual(self.client.get('/').status_code, 200)
+        self.assertIn('GET posts:index', logs.output[0])
+
+    @override_settings(QUERY_BUDGETS={'GET posts:post_create': 0},
+                       QUERY_BUDGET_STRICT=True)
+    def test_budget_is_per_method(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('posts:post_create'),
+                                    {'text': 'Пост'})
+        self.assertEqual(response.status_code, 302)
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('posts:post_create'))
+
+
+def increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = self.create()
+
+    def create(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_values_round_trip(self):
+        self.cache.set('set', frozenset({1, 2}))
+        self.cache.set_many({'text': 'строка', 'number': 5})
+        self.assertEqual(self.cache.get('set'), {1, 2})
+        self.assertEqual(self.cache.get_many(['text', 'number', 'none']),
+                         {'text': 'строка', 'number': 5})
+        self.assertIsNone(self.cache.get('none'))
+        self.cache.delete('text')
+        self.assertFalse(self.cache.has_key('text'))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('set'))
+
+    def test_expired_keys_are_missing(self):
+        self.cache.set('short', 1, 0.01)
+        self.assertTrue(self.cache.add('forever', 1, None))
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 2))
+        self.assertFalse(self.cache.add('forever', 2))
+        self.assertEqual(self.cache.get_many(['short', 'forever']),
+                         {'short': 2, 'forever': 1})
+
+    def test_shared_between_instances(self):
+        self.cache.set('key', 'value')
+        self.assertEqual(self.create().get('key'), 'value')
+
+    def test_incr(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        self.assertEqual(self.cache.decr('counter'), 2)
+        with self.assertRaises(ValueError):
+            self.cache.incr('none')
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            list(executor.map(increment, [self.location] * 4, [50] * 4))
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_evicts_least_recently_read(self):
+        cache = self.create(MAX_ENTRIES=3, CULL_FREQUENCY=3,
+                            ACCESS_RESOLUTION=0)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertEqual(set(cache.get_many(['a', 'b', 'c', 'd'])),
+                         {'a', 'c', 'd'})
+
+    def test_size_cap(self):
+        cache = self.create(MAX_SIZE=10000)
+        for number in range(20):
+            cache.set(f'key{number}', 'x' * 1000)
+        total = cache.db.execute('SELECT total FROM cache_size').fetchone()
+        self.assertLessEqual(total[0], 10000)
+        self.assertIsNotNone(cache.get('key19'))
+
+    def test_tests_do_not_share_development_cache(self):
+        location = settings.CACHES['default']['LOCATION']
+        self.assertFalse(location.startswith(settings.BASE_DIR))
+
+
+class BenchCacheTests(SimpleTestCase):
+    def test_shared_cache_keeps_counter(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            out = StringIO()
+            call_command('bench_cache', '--workers', '2',
+                         '--operations=40', '--keys=10', '--render-ms=0',
+                         '--incr-every=4', f'--output={output}', stdout=out)
+            with open(output, encoding='utf-8') as report:
+                results = json.load(report)['results']
+        self.assertIn('sqlite:2', out.getvalue())
+        self.assertEqual(results['sqlite:2']['counter'], 20)
+        self.assertEqual(results['locmem:2']['counter'], 10)
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections.databases['tuned'] = {
+            'ENGINE': 'core.backends.sqlite3',
+            'NAME': os.path.join(directory.name, 'db.sqlite3'),
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE',
+                        'serialize_writes': True,
+                        'pragmas': {'cache_size': -1024}},
+        }
+        self.addCleanup(connections.databases.pop, 'tuned')
+        self.addCleanup(self.forget_connection)
+
+    def forget_connection(self):
+        if hasattr(connections._connections, 'tuned'):
+            connections['tuned'].close()
+            del connections['tuned']
+
+    @property
+    def tuned(self):
+        return connections['tuned']
+
+    def pragma(self, name, using='tuned'):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'),
+                         DEFAULT_PRAGMAS['busy_timeout'])
+        self.assertEqual(self.pragma('cache_size'), -1024)
+        self.assertEqual(self.pragma('busy_timeout', 'default'),
+                         DEFAULT_PRAGMAS['busy_timeout'])
+
+    def test_transactions_hold_write_lock(self):
+        with self.tuned.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+        with transaction.atomic(using='tuned'):
+            self.assertTrue(self.tuned.write_lock.locked())
+            with self.tuned.cursor() as cursor:
+                cursor.execute('INSERT INTO item DEFAULT VALUES')
+        self.assertFalse(self.tuned.write_lock.locked())
+        with self.assertRaises(ZeroDivisionError):
+            with transaction.atomic(using='tuned'):
+                1 / 0
+        self.assertFalse(self.tuned.write_lock.locked())
+        with self.tuned.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_unknown_transaction_mode(self):
+        connections.databases['tuned']['OPTIONS']['transaction_mode'] = 'X'
+        with self.assertRaises(ValueError):
+            connections['tuned']
+
+    def test_default_connection_uses_backend(self):
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+class BenchSQLiteTests(SimpleTestCase):
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            out = StringIO()
+            call_command('bench_sqlite', '--readers=1', '--writers=2',
+                         '--seconds=0.2', '--posts=10',
+                         f'--output={output}', stdout=out)
+            with open(output, encoding='utf-8') as report:
+                results = json.load(report)['results']
+        self.assertEqual(set(results), {'stock', 'tuned', 'serialized'})
+        self.assertEqual(results['tuned']['errors'], 0)
+        self.assertGreater(results['serialized']['writes'], 0)
+        self.assertIn('serialized: чтений', out.getvalue())
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Реплика в тестах — зеркало основной базы.
+
+    Её соединение видит только закоммиченные данные, поэтому здесь
+    TransactionTestCase.
+    """
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='Rin')
+        self.post = Post.objects.create(text='Пост', author=self.user)
+        self.client.force_login(self.user)
+        self.client.get(reverse('posts:index'))
+
+    def replica_file(self):
+        """Реплика в отдельном файле: она отстаёт до sync_replicas."""
+        replica = connections['replica']
+        name = replica.settings_dict['NAME']
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        replica.close()
+        replica.settings_dict['NAME'] = os.path.join(directory.name,
+                                                     'replica.sqlite3')
+
+        def restore():
+            replica.close()
+            replica.settings_dict['NAME'] = name
+        self.addCleanup(restore)
+        return replica.settings_dict['NAME']
+
+    def replica_queries(self, url):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            self.client.get(url)
+        return len(queries.captured_queries)
+
+    def test_reads_from_fresh_replica(self):
+        routers.mark_synced('replica', time.time())
+        with self.assertLogs('core.routers', 'INFO') as logs:
+            self.assertTrue(self.replica_queries(reverse('posts:index')))
+        self.assertIn('чтение с реплики replica', logs.output[0])
+
+    def test_stale_or_unsynced_replica_is_skipped(self):
+        self.assertFalse(self.replica_queries(reverse('posts:index')))
+        routers.mark_synced('replica', time.time() - 100)
+        with self.assertLogs('core.routers', 'WARNING') as logs:
+            self.assertFalse(self.replica_queries(reverse('posts:index')))
+        self.assertIn('Реплика replica отстаёт', logs.output[0])
+
+    def test_write_pins_reader_to_primary(self):
+        routers.mark_synced('replica', time.time())
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'}
+        )
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            self.assertFalse(self.replica_queries(reverse('posts:index')))
+        self.assertIn('после записи', logs.output[0])
+        self.client.cookies[settings.REPLICA_PIN_COOKIE] = '0'
+        self.assertTrue(self.replica_queries(reverse('posts:index')))
+
+    def test_pin_outlasts_replica_lag(self):
+        with override_settings(REPLICA_PIN_SECONDS=1):
+            response = self.client.post(
+                reverse('posts:add_comment',
+                        kwargs={'post_id': self.post.pk}),
+                {'text': 'Комментарий'}
+            )
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_MAX_LAG)
+
+    def test_follow_graph_is_filled_from_primary(self):
+        routers.use_replica('replica')
+        self.addCleanup(routers.use_replica, None)
+        with CaptureQueriesContext(connections['replica']) as queries:
+            follow_graph.following(self.user.pk)
+        self.assertFalse(queries.captured_queries)
+
+    def test_router(self):
+        router = routers.ReplicaRouter()
+        routers.use_replica('replica')
+        self.addCleanup(routers.use_replica, None)
+        self.assertEqual(router.db_for_read(Post), 'replica')
+        self.assertIsNone(router.db_for_read(Session))
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+
+    def test_sync_replicas(self):
+        target = self.replica_file()
+        out = StringIO()
+        call_command('sync_replicas', stdout=out)
+        self.assertIn('replica: скопировано', out.getvalue())
+        self.assertLess(routers.replica_lags(['replica'])['replica'], 5)
+        copy = sqlite3.connect(target)
+        self.addCleanup(copy.close)
+        self.assertEqual(
+            copy.execute('SELECT text FROM posts_post').fetchall(),
+            [('Пост',)]
+        )
+
+    def test_replica_synced_before_changes_is_skipped(self):
+        self.replica_file()
+        call_command('sync_replicas', stdout=StringIO())
+        self.client.logout()
+        post = Post.objects.create(text='Свежий пост', author=self.user)
+        with self.assertLogs('core.routers', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.text)
+        self.assertIn('снята до изменений', logs.output[-1])
+        call_command('sync_replicas', stdout=StringIO())
+        with self.assertLogs('core.routers', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'),
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('чтение с реплики replica', logs.output[0])
@@ -1,35 +1,160 @@
-from django.contrib import admin
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin
 
+from core.admin import (IndexedDatesMixin, ScalableAdminMixin,
+                        autocomplete_filter)
+from . import deletion, search
+from .bulk import Bulk
 from .models import Group, Post, Comment, Follow
 
 
-class PostAdmin(admin.ModelAdmin):
+User = get_user_model()
+
+
+class FullTextSearchMixin:
+    """Поиск в админке через индекс FTS5 вместо LIKE '%q%'."""
+    search_comments = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search.match_expression(search_term):
+            return queryset, False
+        return queryset.filter(
+            pk__in=search.matching_ids(search_term, self.search_comments)
+        ), False
+
+
+class BatchDeletionMixin:
+    """Действие удаления с каскадом пачками, по умолчанию в фоне."""
+    deletion_kind = None
+    actions = ('delete_in_batches',)
+
+    def delete_in_batches(self, request, queryset):
+        pks = list(queryset.values_list('pk', flat=True))
+        for pk in pks:
+            if settings.DELETION_IN_BACKGROUND:
+                deletion.schedule(self.deletion_kind, pk)
+            else:
+                deletion.delete(self.deletion_kind, pk)
+        if settings.DELETION_IN_BACKGROUND:
+            self.message_user(request, f'Запущено удаление в фоне: '
+                                       f'{len(pks)}. Ход удаления — в логе.')
+        else:
+            self.message_user(request, f'Удалено: {len(pks)}')
+    delete_in_batches.short_description = 'Удалить пачками вместе с каскадом'
+
+
+class GroupActionForm(ActionForm):
+    """Группа для переноса — полем автодополнения, без списка всех групп."""
+    group = forms.ModelChoiceField(
+        Group.objects.all(), required=False, label='Группа',
+        widget=AutocompleteSelect(Post._meta.get_field('group').remote_field,
+                                  admin.site)
+    )
+
+
+def bulk_report(admin, request, bulk):
+    summary = ', '.join(f'{step} {count}'
+                        for step, count in bulk.counts.items())
+    admin.message_user(request, f'Готово: {summary or "ничего не изменено"}')
+
+
+class BulkPostActionsMixin:
+    """Действия над выбранными постами: UPDATE и DELETE пачками."""
+    action_form = GroupActionForm
+
+    def move_to_group(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid():
+            errors = '; '.join(error for field_errors in form.errors.values()
+                               for error in field_errors)
+            self.message_user(request, f'Посты не перенесены: {errors}',
+                              messages.ERROR)
+            return
+        group = form.cleaned_data['group']
+        if group is None:
+            self.message_user(request, 'Выберите группу. Чтобы убрать посты '
+                                       'из групп, есть действие «Убрать из '
+                                       'группы».', messages.ERROR)
+            return
+        bulk = Bulk()
+        bulk.move_to_group(queryset, group.pk)
+        bulk_report(self, request, bulk)
+    move_to_group.short_description = 'Перенести в выбранную группу'
+
+    def remove_from_group(self, request, queryset):
+        bulk = Bulk()
+        bulk.move_to_group(queryset, None)
+        bulk_report(self, request, bulk)
+    remove_from_group.short_description = 'Убрать из группы'
+
+    def clear_images(self, request, queryset):
+        bulk = Bulk()
+        bulk.clear_images(queryset)
+        bulk_report(self, request, bulk)
+    clear_images.short_description = 'Убрать картинки'
+
+
+class PostAdmin(BulkPostActionsMixin, BatchDeletionMixin, FullTextSearchMixin,
+                IndexedDatesMixin, ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group', 'image')
     list_editable = ('group', )
+    list_select_related = ('author', 'group')
     search_fields = ('text', )
-    list_filter = ('pub_date', )
+    list_filter = ('pub_date', autocomplete_filter('author', 'автору'),
+                   autocomplete_filter('group', 'группе'))
+    date_hierarchy = 'pub_date'
     empty_value_display = ('-пусто-')
+    deletion_kind = 'post'
+    actions = ('move_to_group', 'remove_from_group', 'clear_images',
+               'delete_in_batches')
 
 
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(BatchDeletionMixin, ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('title', 'slug', 'description')
-    list_filter = ('title', )
+    search_fields = ('title', 'slug')
     empty_value_display = '-пусто-'
+    deletion_kind = 'group'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, IndexedDatesMixin,
+                   ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('post', 'author', 'text', 'created')
-    list_filter = ('created', )
+    list_select_related = ('post', 'author')
+    list_filter = ('created', autocomplete_filter('author', 'автору'))
+    date_hierarchy = 'created'
     search_fields = ('text', )
+    search_comments = True
     empty_value_display = '-пусто-'
+    actions = ('delete_comments',)
+
+    def delete_comments(self, request, queryset):
+        bulk = Bulk()
+        bulk.comments(queryset)
+        bulk_report(self, request, bulk)
+    delete_comments.short_description = 'Удалить пачками'
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'author')
-    list_filter = ('user', )
+    list_select_related = ('user', 'author')
+    list_filter = (autocomplete_filter('user', 'подписчику'),
+                   autocomplete_filter('author', 'автору'))
+
+
+class BatchDeletionUserAdmin(BatchDeletionMixin, ScalableAdminMixin,
+                             UserAdmin):
+    deletion_kind = 'user'
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.unregister(User)
+admin.site.register(User, BatchDeletionUserAdmin)
@@ -0,0 +1,58 @@
+"""Массовые правки постов и комментариев без save() по одному.
+
+Каждая пачка id меняется одним UPDATE или DELETE, а то, что при
+save() и delete() делают сигналы — счётчики, индекс поиска и
+поколения кэша, — делается на всю пачку сразу.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import counters, feeds, generations
+from .deletion import Cascade
+
+
+def post_scopes(batch, *group_ids):
+    """Области кэша пачки (id, author_id, group_id) и групп group_ids."""
+    groups = {group_id for _, _, group_id in batch} | set(group_ids)
+    return ('index',
+            *{f'author:{author_id}' for _, author_id, _ in batch},
+            *(f'group:{group_id}' for group_id in groups
+              if group_id is not None),
+            *(f'post:{pk}' for pk, _, _ in batch))
+
+
+class Bulk(Cascade):
+    """Пачечные правки; удаление — posts() и comments() из Cascade."""
+
+    def move_to_group(self, rows, group_id):
+        """Переносит посты в группу group_id; None — убирает из групп."""
+        if group_id is None:
+            rows = rows.filter(group__isnull=False)
+        else:
+            rows = rows.exclude(group_id=group_id)
+        for batch in self.chunks(rows, 'author_id', 'group_id'):
+            moved = Counter(old for _, _, old in batch if old is not None)
+            with transaction.atomic(using=rows.db), transaction.atomic():
+                rows.model.objects.using(rows.db).filter(
+                    pk__in=[pk for pk, _, _ in batch]
+                ).update(group_id=group_id, updated=timezone.now())
+                for old, count in moved.items():
+                    counters.bump_group(old, -count)
+                counters.bump_group(group_id, len(batch))
+            generations.bump(*post_scopes(batch, group_id))
+            feeds.bump_feeds(*{author_id for _, author_id, _ in batch})
+            self.done('moved', len(batch))
+
+    def clear_images(self, rows):
+        for batch in self.chunks(rows.exclude(image=''), 'author_id',
+                                 'group_id'):
+            with transaction.atomic(using=rows.db):
+                rows.model.objects.using(rows.db).filter(
+                    pk__in=[pk for pk, _, _ in batch]
+                ).update(image='', thumbnail_ready=False,
+                         updated=timezone.now())
+            generations.bump(*post_scopes(batch))
+            feeds.bump_feeds(*{author_id for _, author_id, _ in batch})
+            self.done('images', len(batch))
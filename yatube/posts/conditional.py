@@ -0,0 +1,76 @@
+import hashlib
+
+from django.views.decorators.http import condition
+
+from . import generations, sharding
+from .models import Group, User
+
+
+def viewer(request):
+    """Вариант страницы: у анонимов и у каждого пользователя он свой."""
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return 'anon'
+
+
+def conditional_feed(scopes):
+    """Отвечает 304 по ETag и Last-Modified, не вызывая view.
+
+    scopes(request, **kwargs) возвращает области поколений страницы или
+    None, если объекта нет (тогда view сама ответит 404). Валидаторы
+    считаются по поколениям из кэша, без рендеринга шаблонов.
+    """
+    def state(request, *args, **kwargs):
+        if not hasattr(request, 'feed_generations'):
+            names = scopes(request, *args, **kwargs)
+            request.feed_generations = (
+                None if names is None else generations.generations(*names)
+            )
+        return request.feed_generations
+
+    def etag(request, *args, **kwargs):
+        found = state(request, *args, **kwargs)
+        if found is None:
+            return None
+        raw = ':'.join([viewer(request), request.get_full_path(),
+                        *map(str, found)])
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        found = state(request, *args, **kwargs)
+        if not found:
+            return None
+        return generations.last_modified(*found)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def index_scopes(request):
+    return ['index', *generations.viewer_scopes(request.user)]
+
+
+def group_scopes(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        return None
+    return [f'group:{group_id}', *generations.viewer_scopes(request.user)]
+
+
+def profile_scopes(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return [f'author:{author_id}', *generations.viewer_scopes(request.user)]
+
+
+def post_scopes(request, post_id):
+    author_id = sharding.post_rows(post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return [f'post:{post_id}', f'author:{author_id}']
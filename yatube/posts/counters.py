@@ -0,0 +1,147 @@
+from collections import Counter
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import sharding
+from .models import Group, UserStats
+
+
+def bump_user(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя, создавая строку при нужде."""
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if UserStats.objects.filter(user_id=user_id).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            UserStats.objects.create(user_id=user_id, **deltas)
+    except IntegrityError:
+        UserStats.objects.filter(user_id=user_id).update(**changes)
+
+
+def bump_users(user_ids, **deltas):
+    """Одинаково сдвигает счётчики многих пользователей одним UPDATE."""
+    if len(user_ids) == 1:
+        return bump_user(user_ids[0], **deltas)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True
+    )
+    UserStats.objects.filter(user_id__in=user_ids).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            posts_count=F('posts_count') + delta
+        )
+
+
+def bump_post(post_id, delta):
+    sharding.post_rows(post_id).update(
+        comments_count=F('comments_count') + delta,
+        updated=timezone.now()
+    )
+
+
+def related_count(model, field):
+    """Подзапрос количества строк model, ссылающихся на внешнюю строку."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by().values(field)
+            .annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        Value(0)
+    )
+
+
+def recount(rows, counters):
+    """Сверяет и переписывает счётчики строк одним UPDATE.
+
+    Возвращает количество счётчиков, разошедшихся с данными.
+    """
+    actual = rows.annotate(
+        **{f'actual_{field}': value for field, value in counters.items()}
+    )
+    drift = sum(actual.exclude(**{field: F(f'actual_{field}')}).count()
+                for field in counters)
+    rows.update(**counters)
+    return drift
+
+
+def sharded_counts(post_model, field):
+    """Количество постов по значению field, сложенное по всем шардам."""
+    totals = Counter()
+    for alias in sharding.shard_databases():
+        totals.update(dict(
+            post_model.objects.using(alias).order_by().values_list(field)
+            .annotate(total=Count('pk'))
+        ))
+    return totals
+
+
+def store_counts(model, field, totals):
+    """Записывает посчитанные по id значения, возвращает расхождения."""
+    stale = []
+    for row in model.objects.only('pk', field).iterator():
+        actual = totals.get(row.pk, 0)
+        if getattr(row, field) != actual:
+            setattr(row, field, actual)
+            stale.append(row)
+    model.objects.bulk_update(stale, [field], batch_size=500)
+    return len(stale)
+
+
+def recount_all(apps=global_apps):
+    """Пересчитывает все счётчики одним UPDATE на таблицу.
+
+    Возвращает количество счётчиков, разошедшихся с данными.
+    Принимает реестр моделей, чтобы работать и из миграций.
+    При шардировании комментарии считаются на шарде их постов, а посты
+    групп и авторов — по всем шардам и записываются только изменённые.
+    """
+    user_model = apps.get_model(settings.AUTH_USER_MODEL)
+    post_model = apps.get_model('posts', 'Post')
+    group_model = apps.get_model('posts', 'Group')
+    comment_model = apps.get_model('posts', 'Comment')
+    follow_model = apps.get_model('posts', 'Follow')
+    stats_model = apps.get_model('posts', 'UserStats')
+
+    stats_model.objects.bulk_create(
+        [stats_model(user_id=pk) for pk in user_model.objects.exclude(
+            pk__in=stats_model.objects.values('user_id')
+        ).values_list('pk', flat=True)],
+        batch_size=500,
+        ignore_conflicts=True
+    )
+    comments = {'comments_count': related_count(comment_model, 'post')}
+    follows = {
+        'followers_count': related_count(follow_model, 'author'),
+        'following_count': related_count(follow_model, 'user'),
+    }
+    if sharding.is_sharded():
+        drift = sum(recount(post_model.objects.using(alias), comments)
+                    for alias in sharding.shard_databases())
+        drift += recount(stats_model.objects.all(), follows)
+        drift += store_counts(group_model, 'posts_count',
+                              sharded_counts(post_model, 'group'))
+        return drift + store_counts(stats_model, 'posts_count',
+                                    sharded_counts(post_model, 'author'))
+    targets = (
+        (post_model, comments),
+        (group_model, {'posts_count': related_count(post_model, 'group')}),
+        (stats_model, {
+            'posts_count': related_count(post_model, 'author'),
+            **follows,
+        }),
+    )
+    return sum(recount(model.objects.all(), counters)
+               for model, counters in targets)
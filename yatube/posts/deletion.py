@@ -0,0 +1,213 @@
+"""Удаление больших каскадов пачками.
+
+Collector Django перед удалением загружает в память все зависимые
+строки и удаляет их одной транзакцией, держа блокировку записи.
+Здесь каскад раскладывается на шаги от листьев к корню: каждый шаг
+выбирает не больше batch_size id по ключу и удаляет их одним DELETE
+в короткой транзакции без сигналов, а побочные эффекты сигналов —
+счётчики, поиск, ленты и поколения кэша — делает сам, на всю пачку.
+Прерванное удаление можно запустить снова: оно продолжит с остатка.
+"""
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+
+from . import (counters, feeds, follow_graph, generations, search, sharding,
+               timeline)
+from .models import Comment, Follow, Group, Post, TimelineEntry
+
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+executor = None
+
+
+def get_executor():
+    """Один поток: фоновые удаления не спорят друг с другом за запись."""
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=1,
+                                      thread_name_prefix='deletion')
+    return executor
+
+
+def log_progress(step, total):
+    logger.info('Удалено %s: %s', step, total)
+
+
+def raw_delete(rows, pks):
+    """DELETE по списку id без Collector и сигналов."""
+    rows.model.objects.using(rows.db).filter(pk__in=pks)._raw_delete(rows.db)
+
+
+class Cascade:
+    """Пошаговое удаление пачками по batch_size строк.
+
+    После каждой пачки вызывается report(шаг, удалено на шаге всего)
+    и выдерживается pause секунд, чтобы между пачками успевали
+    писать другие запросы.
+    """
+
+    def __init__(self, batch_size=None, pause=None, report=log_progress):
+        self.batch_size = batch_size or settings.DELETION_BATCH_SIZE
+        if pause is None:
+            pause = settings.DELETION_PAUSE
+        self.pause = pause
+        self.report = report
+        self.counts = Counter()
+
+    def done(self, step, count):
+        self.counts[step] += count
+        self.report(step, self.counts[step])
+        if self.pause:
+            time.sleep(self.pause)
+
+    def chunks(self, rows, *fields):
+        """Пачки (id, *fields) по возрастанию id: в памяти одна пачка."""
+        rows = rows.order_by('pk')
+        last = None
+        while True:
+            page = rows if last is None else rows.filter(pk__gt=last)
+            batch = list(page.values_list('pk', *fields)[:self.batch_size])
+            if not batch:
+                return
+            yield batch
+            last = batch[-1][0]
+
+    def comments(self, rows, recount=True):
+        """Комментарии; recount=False — их посты удаляются следом."""
+        for batch in self.chunks(rows, 'post_id'):
+            per_post = Counter(post_id for _, post_id in batch)
+            with transaction.atomic(using=rows.db), transaction.atomic():
+                raw_delete(rows, [pk for pk, _ in batch])
+                search.remove(*(search.comment_rowid(pk) for pk, _ in batch))
+                if recount:
+                    for post_id, count in per_post.items():
+                        counters.bump_post(post_id, -count)
+            generations.bump(*(f'post:{post_id}' for post_id in per_post))
+            self.done('comments', len(batch))
+
+    def timeline(self, rows):
+        for batch in self.chunks(rows):
+            with transaction.atomic(using=rows.db):
+                raw_delete(rows, [pk for pk, in batch])
+            self.done('timeline', len(batch))
+
+    def posts(self, rows):
+        """Посты вместе с их комментариями и записями лент."""
+        alias = rows.db
+        for batch in self.chunks(rows, 'author_id', 'group_id'):
+            post_ids = [pk for pk, _, _ in batch]
+            self.comments(Comment.objects.using(alias).filter(
+                post_id__in=post_ids
+            ), recount=False)
+            self.timeline(TimelineEntry.objects.filter(post_id__in=post_ids))
+            authors = Counter(author_id for _, author_id, _ in batch)
+            groups = Counter(group_id for _, _, group_id in batch
+                             if group_id is not None)
+            with transaction.atomic(using=alias), transaction.atomic():
+                raw_delete(rows, post_ids)
+                search.remove(*map(search.post_rowid, post_ids))
+                for author_id, count in authors.items():
+                    counters.bump_user(author_id, posts_count=-count)
+                for group_id, count in groups.items():
+                    counters.bump_group(group_id, -count)
+            for author_id in authors:
+                feeds.forget_author(author_id)
+            feeds.bump_feeds(*authors)
+            if sharding.is_sharded():
+                sharding.forget(*post_ids)
+            generations.bump(
+                'index', *(f'author:{author_id}' for author_id in authors),
+                *(f'group:{group_id}' for group_id in groups),
+                *(f'post:{post_id}' for post_id in post_ids)
+            )
+            self.done('posts', len(batch))
+
+    def follows(self, user_id):
+        """Подписки пользователя и подписки на него."""
+        rows = Follow.objects.filter(user_id=user_id)
+        for batch in self.chunks(rows, 'author_id'):
+            with transaction.atomic():
+                raw_delete(rows, [pk for pk, _ in batch])
+                authors = [author_id for _, author_id in batch]
+                counters.bump_users(authors, followers_count=-1)
+                timeline.demote(authors)
+            self.done('follows', len(batch))
+        rows = Follow.objects.filter(author_id=user_id)
+        for batch in self.chunks(rows, 'user_id'):
+            followers = [follower_id for _, follower_id in batch]
+            with transaction.atomic():
+                raw_delete(rows, [pk for pk, _ in batch])
+                counters.bump_users(followers, following_count=-1)
+            follow_graph.forget(*followers)
+            generations.bump(*(f'follower:{pk}' for pk in followers))
+            self.done('followers', len(batch))
+
+    def user(self, user_id):
+        """Сначала блокирует вход, в конце удаляет саму строку."""
+        User.objects.filter(pk=user_id).update(is_active=False)
+        for alias in sharding.shards():
+            self.comments(Comment.objects.using(alias).filter(
+                author_id=user_id
+            ))
+            self.posts(Post.objects.using(alias).filter(author_id=user_id))
+        self.follows(user_id)
+        self.timeline(TimelineEntry.objects.filter(user_id=user_id))
+        with transaction.atomic():
+            _, deleted = User.objects.filter(pk=user_id).delete()
+        self.done('users', deleted.get(User._meta.label, 0))
+
+    def group(self, group_id):
+        """Отвязывает посты от группы пачками, затем удаляет группу."""
+        for alias in sharding.shards():
+            rows = Post.objects.using(alias).filter(group_id=group_id)
+            for batch in self.chunks(rows, 'author_id'):
+                post_ids = [pk for pk, _ in batch]
+                with transaction.atomic(using=alias):
+                    rows.filter(pk__in=post_ids).update(group=None)
+                authors = {author_id for _, author_id in batch}
+                generations.bump(
+                    'index', *(f'author:{pk}' for pk in authors),
+                    *(f'post:{pk}' for pk in post_ids)
+                )
+                feeds.bump_feeds(*authors)
+                self.done('posts', len(batch))
+        with transaction.atomic():
+            _, deleted = Group.objects.filter(pk=group_id).delete()
+        generations.bump(f'group:{group_id}')
+        self.done('groups', deleted.get(Group._meta.label, 0))
+
+    def post(self, post_id):
+        self.posts(sharding.post_rows(post_id))
+
+
+DELETERS = {'user': Cascade.user, 'group': Cascade.group,
+            'post': Cascade.post}
+
+
+def delete(kind, pk, **options):
+    """Удаляет пользователя, группу или пост со всем каскадом."""
+    cascade = Cascade(**options)
+    DELETERS[kind](cascade, pk)
+    return cascade.counts
+
+
+def run(kind, pk):
+    """delete() для фонового потока: ошибки — в лог, соединения закрыть."""
+    try:
+        return delete(kind, pk)
+    except Exception:
+        logger.exception('Не удалось удалить %s %s', kind, pk)
+    finally:
+        connections.close_all()
+
+
+def schedule(kind, pk):
+    """Ставит удаление в фоновый поток после коммита транзакции."""
+    transaction.on_commit(lambda: get_executor().submit(run, kind, pk))
@@ -0,0 +1,162 @@
+import heapq
+from collections import namedtuple
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from . import follow_graph, generations, sharding
+from .models import Follow, TimelineEntry, UserStats
+from .pagination import CursorPaginator, get_cursor_page
+
+
+FeedItem = namedtuple('FeedItem', ['pub_date', 'post_id'])
+
+HEAVY_AUTHORS_KEY = 'feed:heavy_authors'
+LATEST_POSTS_KEY = 'feed:latest:{}'
+STATS_KEY = 'feed:stats:{}'
+FEED_PATHS = ('push', 'hybrid')
+
+
+def heavy_authors():
+    """Множество id авторов, чьи посты не раскладываются по лентам."""
+    authors = cache.get(HEAVY_AUTHORS_KEY)
+    if authors is None:
+        authors = set(
+            Follow.objects.values('author_id')
+            .annotate(followers=Count('pk'))
+            .filter(followers__gte=settings.FEED_HEAVY_AUTHOR_FOLLOWERS)
+            .values_list('author_id', flat=True)
+        )
+        cache.set(HEAVY_AUTHORS_KEY, authors,
+                  settings.FEED_HEAVY_AUTHORS_TIMEOUT)
+    return authors
+
+
+def is_heavy(followers_count):
+    return followers_count >= settings.FEED_HEAVY_AUTHOR_FOLLOWERS
+
+
+def mark_heavy(author_id):
+    """Сбрасывает множество: при промахе оно пересчитается с автором.
+
+    Дописывать в него нельзя: из двух одновременных дописываний
+    одно бы потерялось.
+    """
+    if author_id not in heavy_authors():
+        forget_heavy_authors()
+
+
+def forget_heavy_authors():
+    cache.delete(HEAVY_AUTHORS_KEY)
+
+
+def latest_posts(author_id):
+    """Последние посты автора как список FeedItem от новых к старым."""
+    key = LATEST_POSTS_KEY.format(author_id)
+    items = cache.get(key)
+    if items is None:
+        items = [
+            FeedItem(*row) for row in
+            sharding.posts_of(author_id)
+            .order_by('-pub_date', '-pk')
+            .values_list('pub_date', 'pk')
+            [:settings.FEED_AUTHOR_LATEST_LENGTH]
+        ]
+        cache.set(key, items, settings.FEED_AUTHOR_LATEST_TIMEOUT)
+    return items
+
+
+def forget_author(author_id):
+    """Сбрасывает последние посты автора, latest_posts загрузит их снова.
+
+    Список хранится со сроком: загруженный до коммита нового поста
+    проживёт не дольше FEED_AUTHOR_LATEST_TIMEOUT.
+    """
+    cache.delete(LATEST_POSTS_KEY.format(author_id))
+
+
+def bump_feeds(*author_ids):
+    """Сдвигает поколения лент подписок у подписчиков лёгких авторов.
+
+    Ленты подписчиков тяжёлых авторов читают поколения author: сами.
+    Подписчики читаются пачками по id подписки.
+    """
+    light = UserStats.objects.filter(
+        user_id__in=author_ids, followers_count__gt=0,
+        followers_count__lt=settings.FEED_HEAVY_AUTHOR_FOLLOWERS
+    ).values_list('user_id', flat=True)
+    rows = Follow.objects.filter(author_id__in=list(light)).order_by(
+        'pk'
+    ).values_list('pk', 'user_id')
+    last = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last)[:settings.TIMELINE_BATCH_SIZE])
+        if not batch:
+            return
+        generations.bump(*(f'feed:{user_id}' for _, user_id in batch))
+        last = batch[-1][0]
+
+
+def record_path(path):
+    key = STATS_KEY.format(path)
+    if not cache.add(key, 1, None):
+        cache.incr(key)
+
+
+def feed_stats():
+    """Сколько запросов ленты обслужил каждый путь сборки."""
+    return {path: cache.get(STATS_KEY.format(path), 0)
+            for path in FEED_PATHS}
+
+
+class HybridFeedPaginator(CursorPaginator):
+    """Лента подписок: разложенные записи плюс посты тяжёлых авторов.
+
+    Записи TimelineEntry и списки последних постов тяжёлых авторов
+    сливаются k-путевым слиянием по (pub_date, id) на куче.
+    """
+
+    def __init__(self, user, per_page):
+        entries = TimelineEntry.objects.filter(user=user).values_list(
+            'pub_date', 'post_id'
+        )
+        super().__init__(entries, per_page, key=('pub_date', 'post_id'))
+        self.followed = follow_graph.following(user.pk)
+        self.pull_authors = sorted(self.followed & heavy_authors())
+        self.path = 'hybrid' if self.pull_authors else 'push'
+
+    def pulled(self, author_id, limit, after=None, before=None):
+        items = latest_posts(author_id)
+        if before is not None:
+            return [item for item in reversed(items) if item > before][:limit]
+        if after is not None:
+            items = [item for item in items if item < after]
+        return items[:limit]
+
+    def fetch(self, limit, after=None, before=None, offset=0):
+        size = offset + limit
+        sources = [
+            [FeedItem(*row) for row in super(HybridFeedPaginator, self)
+             .fetch(size, after, before)]
+        ]
+        sources.extend(self.pulled(author_id, size, after, before)
+                       for author_id in self.pull_authors)
+        merged = heapq.merge(*sources, reverse=before is None)
+        seen = set()
+        unique = (item for item in merged
+                  if item.post_id not in seen and not seen.add(item.post_id))
+        return list(islice(unique, offset, size))
+
+    def items(self, rows):
+        posts = sharding.in_bulk([item.post_id for item in rows],
+                                 'author', 'group')
+        return [posts[item.post_id] for item in rows if item.post_id in posts]
+
+
+def follow_feed(user, query):
+    """Страница ленты подписок пользователя по параметрам запроса."""
+    paginator = HybridFeedPaginator(user, settings.POSTS_PER_PAGE)
+    record_path(paginator.path)
+    return get_cursor_page(paginator, query, settings.POSTS_MAX_PAGE)
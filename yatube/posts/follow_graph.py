@@ -0,0 +1,99 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import Follow
+
+
+FOLLOWING_KEY = 'graph:following:{}'
+
+
+def following(user_id):
+    """Множество id авторов, на которых подписан пользователь.
+
+    Хранится в кэше целиком и без срока, поэтому при промахе читается
+    из основной базы, а не с отстающей реплики. Загруженное множество
+    не перезаписывает уже поправленное.
+    """
+    key = FOLLOWING_KEY.format(user_id)
+    authors = cache.get(key)
+    if authors is None:
+        authors = frozenset(
+            Follow.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id)
+            .values_list('author_id', flat=True)
+        )
+        cache.add(key, authors, None)
+    return authors
+
+
+def is_following(user_id, author_id):
+    return author_id in following(user_id)
+
+
+def annotate(posts, user):
+    """Проставляет постам follow_state по одному множеству подписок.
+
+    'following' и 'follow' — показать кнопку отписки или подписки;
+    анонимам и на собственных постах кнопки нет.
+    """
+    if not user.is_authenticated:
+        return
+    authors = following(user.pk)
+    for post in posts:
+        if post.author_id == user.pk:
+            post.follow_state = ''
+        elif post.author_id in authors:
+            post.follow_state = 'following'
+        else:
+            post.follow_state = 'follow'
+
+
+class Change:
+    """Правка множества подписок, которую прибавляет cache.incr.
+
+    incr читает и записывает значение одной транзакцией кэша, поэтому
+    одновременные правки одного множества не теряют друг друга.
+    """
+
+    def __init__(self, added=(), removed=()):
+        self.added, self.removed = frozenset(added), frozenset(removed)
+
+    def __radd__(self, authors):
+        return (authors | self.added) - self.removed
+
+
+def changed(user_id, added=(), removed=()):
+    """После коммита вносит подписки added и отписки removed в множество.
+
+    Множество, загруженное другим запросом до коммита, тоже получает
+    правку; если множества в кэше нет, его загрузит следующее чтение.
+    """
+    def apply():
+        try:
+            cache.incr(FOLLOWING_KEY.format(user_id), Change(added, removed))
+        except ValueError:
+            pass
+    transaction.on_commit(apply)
+
+
+def forget(*user_ids):
+    cache.delete_many([FOLLOWING_KEY.format(user_id) for user_id in user_ids])
+
+
+def warm(batch_size=1000):
+    """Загружает в кэш подписки всех подписчиков, возвращает их число."""
+    graph, warmed = {}, 0
+    rows = Follow.objects.order_by('user_id').values_list('user_id',
+                                                          'author_id')
+    for user_id, author_id in rows.iterator():
+        if user_id not in graph and len(graph) >= batch_size:
+            warmed += flush(graph)
+        graph.setdefault(user_id, set()).add(author_id)
+    return warmed + flush(graph)
+
+
+def flush(graph):
+    cache.set_many({FOLLOWING_KEY.format(user_id): frozenset(authors)
+                    for user_id, authors in graph.items()}, None)
+    count = len(graph)
+    graph.clear()
+    return count
@@ -0,0 +1,125 @@
+from itertools import groupby
+
+from django.db import connection, transaction
+
+from . import counters, follow_graph, generations, timeline
+from .models import Follow
+
+
+def followed(user_id, author_ids):
+    """Побочные эффекты новых подписок: счётчики, лента и кэш."""
+    counters.bump_user(user_id, following_count=len(author_ids))
+    counters.bump_users(author_ids, followers_count=1)
+    if len(author_ids) == 1:
+        timeline.backfill(user_id, author_ids[0])
+    else:
+        timeline.rebuild(user_id)
+    follow_graph.changed(user_id, added=author_ids)
+    generations.bump_follower(user_id)
+
+
+def unfollowed(user_id, author_ids):
+    counters.bump_user(user_id, following_count=-len(author_ids))
+    counters.bump_users(author_ids, followers_count=-1)
+    timeline.retract(user_id, *author_ids)
+    timeline.demote(author_ids)
+    follow_graph.changed(user_id, removed=author_ids)
+    generations.bump_follower(user_id)
+
+
+def execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def follow(user_id, author_id):
+    """Подписывает одним INSERT, который пропускает существующую подписку.
+
+    Возвращает True, если подписка появилась. На самого себя
+    подписаться нельзя. Строка и побочные эффекты пишутся одной
+    транзакцией, без точки сохранения внутри чужой.
+    """
+    if user_id == author_id:
+        return False
+    ops = connection.ops
+    table = ops.quote_name(Follow._meta.db_table)
+    with transaction.atomic(savepoint=False):
+        created = execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} {table} '
+            f'(user_id, author_id) VALUES (%s, %s) '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [user_id, author_id]
+        )
+        if created:
+            followed(user_id, [author_id])
+    return bool(created)
+
+
+def unfollow(user_id, author_id):
+    """Отписывает одним DELETE; отсутствие подписки не ошибка."""
+    table = connection.ops.quote_name(Follow._meta.db_table)
+    with transaction.atomic(savepoint=False):
+        deleted = execute(
+            f'DELETE FROM {table} WHERE user_id = %s AND author_id = %s',
+            [user_id, author_id]
+        )
+        if deleted:
+            unfollowed(user_id, [author_id])
+    return bool(deleted)
+
+
+def by_user(pairs):
+    """Группирует пары (подписчик, автор) по подписчику."""
+    for user_id, group in groupby(sorted(set(pairs)),
+                                  key=lambda pair: pair[0]):
+        yield user_id, [author_id for _, author_id in group
+                        if author_id != user_id]
+
+
+def follow_many(pairs):
+    """Массовая подписка для импорта, возвращает число новых подписок.
+
+    Для каждого подписчика — один SELECT, один INSERT и общие
+    побочные эффекты на всю пачку авторов.
+    """
+    created = 0
+    for user_id, author_ids in by_user(pairs):
+        with transaction.atomic():
+            existing = set(Follow.objects.filter(
+                user_id=user_id, author_id__in=author_ids
+            ).values_list('author_id', flat=True))
+            new = [author_id for author_id in author_ids
+                   if author_id not in existing]
+            if not new:
+                continue
+            Follow.objects.bulk_create(
+                [Follow(user_id=user_id, author_id=author_id)
+                 for author_id in new],
+                ignore_conflicts=True
+            )
+            followed(user_id, new)
+        created += len(new)
+    return created
+
+
+def unfollow_many(pairs):
+    """Массовая отписка, возвращает число удалённых подписок."""
+    deleted = 0
+    for user_id, author_ids in by_user(pairs):
+        with transaction.atomic():
+            existing = list(Follow.objects.filter(
+                user_id=user_id, author_id__in=author_ids
+            ).values_list('author_id', flat=True))
+            if not existing:
+                continue
+            table = connection.ops.quote_name(Follow._meta.db_table)
+            placeholders = ', '.join(['%s'] * len(existing))
+            execute(
+                f'DELETE FROM {table} WHERE user_id = %s '
+                f'AND author_id IN ({placeholders})',
+                [user_id, *existing]
+            )
+            unfollowed(user_id, existing)
+        deleted += len(existing)
+    return deleted
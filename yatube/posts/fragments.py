@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import follow_graph, thumbnails
+
+
+CARD_KEY = 'fragment:card:{}:{}:{}'
+COMMENTS_KEY = 'fragment:comments:{}:{}'
+STATS_KEY = 'fragment:stats:{}:{}'
+FRAGMENT_KINDS = ('card', 'comments')
+
+
+def stamp(post):
+    return post.updated.timestamp()
+
+
+def record(kind, outcome):
+    key = STATS_KEY.format(kind, outcome)
+    if not cache.add(key, 1, None):
+        cache.incr(key)
+
+
+def fragment_stats():
+    """Попадания и промахи кэша карточек и списков комментариев."""
+    return {
+        kind: {outcome: cache.get(STATS_KEY.format(kind, outcome), 0)
+               for outcome in ('hit', 'miss')}
+        for kind in FRAGMENT_KINDS
+    }
+
+
+def store(kind, key, template, context):
+    record(kind, 'miss')
+    html = render_to_string(template, context)
+    cache.set(key, html, settings.FRAGMENT_CACHE_TIMEOUT)
+    return html
+
+
+def cached_render(kind, key, template, context):
+    html = cache.get(key)
+    if html is None:
+        html = store(kind, key, template, context)
+    else:
+        record(kind, 'hit')
+    return mark_safe(html)
+
+
+def card_key(post):
+    """Карточка общая для всех, кто видит одну и ту же кнопку подписки."""
+    return CARD_KEY.format(post.pk, stamp(post),
+                           getattr(post, 'follow_state', ''))
+
+
+def prefetch_cards(posts, user=None):
+    """Достаёт карточки страницы одним get_many.
+
+    Если передан user, постам проставляется состояние подписки на
+    авторов. Для карточек, которых нет в кэше, заранее находит миниатюры.
+    """
+    posts = list(posts)
+    if user is not None:
+        follow_graph.annotate(posts, user)
+    keys = {card_key(post): post for post in posts}
+    found = cache.get_many(keys)
+    for key, post in keys.items():
+        post.card_html = found.get(key)
+    thumbnails.prefetch(
+        [post for key, post in keys.items() if key not in found], 'card'
+    )
+
+
+def post_card(post):
+    """HTML карточки поста; ключ меняется при каждом изменении поста."""
+    if not hasattr(post, 'card_html'):
+        return cached_render('card', card_key(post),
+                             'includes/post_list.html', {'post': post})
+    if post.card_html is None:
+        return mark_safe(store('card', card_key(post),
+                               'includes/post_list.html', {'post': post}))
+    record('card', 'hit')
+    return mark_safe(post.card_html)
+
+
+def comment_list(post, comments):
+    """HTML списка комментариев; новый комментарий обновляет post.updated."""
+    return cached_render(
+        'comments', COMMENTS_KEY.format(post.pk, stamp(post)),
+        'includes/comment_list.html', {'comments': comments}
+    )
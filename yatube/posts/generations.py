@@ -0,0 +1,101 @@
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+
+from core import routers
+
+
+GENERATION_KEY = 'gen:{}'
+
+
+def now_generation():
+    """Поколение — отметка времени последнего изменения в миллисекундах.
+
+    Поэтому после вытеснения ключа счётчик не вернётся к уже
+    использованному номеру, а по поколению можно отдать Last-Modified.
+    """
+    return int(time.time() * 1000)
+
+
+def generations(*scopes):
+    """Поколения областей; новые заводятся текущим временем.
+
+    Страница по ним кэшируется, поэтому читать её данные с реплики,
+    снятой раньше последнего изменения, нельзя.
+    """
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, now_generation(), None)
+        found.update(cache.get_many(missing))
+    values = [found.get(key, 0) for key in keys]
+    routers.read_changes_since(max(values, default=0) / 1000)
+    return values
+
+
+def version(*scopes):
+    """Версия фрагмента, собранная из поколений всех его областей."""
+    return '.'.join(str(generation) for generation in generations(*scopes))
+
+
+def bump(*scopes):
+    """Сдвигает поколения областей: их фрагменты больше не читаются."""
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    now = now_generation()
+    cache.set_many({key: max(found.get(key, 0) + 1, now) for key in keys},
+                   None)
+
+
+def last_modified(*generations):
+    """Время последнего изменения по набору поколений."""
+    return datetime.fromtimestamp(max(generations) / 1000, tz=timezone.utc)
+
+
+def viewer_scopes(user):
+    """Поколение подписок пользователя: от него зависят кнопки подписки."""
+    if user.is_authenticated:
+        return [f'follower:{user.pk}']
+    return []
+
+
+def index_version(user):
+    return version('index', *viewer_scopes(user))
+
+
+def group_version(group_id, user):
+    return version(f'group:{group_id}', *viewer_scopes(user))
+
+
+def author_version(author_id):
+    return version(f'author:{author_id}')
+
+
+def follow_version(user_id, heavy_author_ids):
+    """Версия ленты подписок: подписки, лента и тяжёлые авторы.
+
+    Посты лёгких авторов сдвигают поколение feed: подписчика, поэтому
+    число читаемых поколений не растёт с числом подписок.
+    """
+    authors = (f'author:{author_id}'
+               for author_id in sorted(heavy_author_ids))
+    return version(f'follower:{user_id}', f'feed:{user_id}', *authors)
+
+
+def bump_post(post, *group_ids):
+    """Сбрасывает ленты, в которых показан пост."""
+    groups = {group_id for group_id in (post.group_id, *group_ids)
+              if group_id is not None}
+    bump('index', f'author:{post.author_id}', f'post:{post.pk}',
+         *(f'group:{group_id}' for group_id in groups))
+
+
+def bump_comments(post_id):
+    bump(f'post:{post_id}')
+
+
+def bump_follower(user_id):
+    bump(f'follower:{user_id}')
@@ -0,0 +1,237 @@
+import json
+import math
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.management.targets import busiest_targets
+
+
+VIEWS = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+         'add_comment')
+LOGIN_REQUIRED = ('follow_index', 'add_comment')
+PERCENTILES = (50, 95, 99)
+
+Scenario = namedtuple('Scenario', [
+    'view', 'method', 'path', 'data', 'user', 'cache', 'cookies'
+])
+
+
+def scenario_name(scenario):
+    return f'{scenario.view}:{scenario.user}:{scenario.cache}'
+
+
+def percentile(latencies, rank):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(latencies)
+    return ordered[max(math.ceil(rank / 100 * len(ordered)) - 1, 0)]
+
+
+def call(application, scenario):
+    """Один запрос к WSGI-приложению, возвращает код ответа."""
+    body = urlencode(scenario.data or {}).encode()
+    environ = {
+        'REQUEST_METHOD': scenario.method,
+        'PATH_INFO': scenario.path,
+        'wsgi.input': BytesIO(body),
+        'CONTENT_LENGTH': str(len(body)),
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        **scenario.cookies,
+    }
+    setup_testing_defaults(environ)
+    status = []
+    response = application(
+        environ, lambda code, headers, exc_info=None: status.append(code)
+    )
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return int(status[0].split()[0])
+
+
+def run_worker(scenario, count, warmup):
+    """Задержки count запросов одного потока или процесса, в секундах."""
+    from yatube.wsgi import application
+
+    latencies, errors = [], 0
+    for number in range(warmup + count):
+        if scenario.cache == 'cold':
+            cache.clear()
+        start = time.perf_counter()
+        status = call(application, scenario)
+        elapsed = time.perf_counter() - start
+        if number < warmup:
+            continue
+        latencies.append(elapsed)
+        errors += status >= 400
+    return latencies, errors
+
+
+def run_pooled(scenario, count, warmup):
+    """run_worker для пула: закрывает соединения потока или процесса."""
+    try:
+        return run_worker(scenario, count, warmup)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Измеряет задержки p50/p95/p99 и пропускную способность '
+            'основных страниц через WSGI-приложение yatube.wsgi. '
+            'Сценарий add_comment записывает комментарии в базу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--views', nargs='+', choices=VIEWS,
+                            default=list(VIEWS))
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на сценарий')
+        parser.add_argument('--warmup', type=int, default=10,
+                            help='Прогревочных запросов на поток')
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--mode', choices=('threads', 'processes'),
+                            default='threads')
+        parser.add_argument('--username',
+                            help='Пользователь для авторизованных запросов')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+        parser.add_argument('--compare',
+                            help='Прошлые результаты для сравнения')
+        parser.add_argument(
+            '--threshold', type=float, default=0.1,
+            help='Допустимый рост p95, доля от прошлого значения'
+        )
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests и --concurrency должны быть '
+                               'больше нуля')
+        self.options = options
+        results = {
+            scenario_name(scenario): self.measure(scenario)
+            for scenario in self.scenarios()
+        }
+        report = {
+            'created': timezone.now().isoformat(),
+            'concurrency': options['concurrency'],
+            'mode': options['mode'],
+            'requests': options['requests'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+        previous = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as baseline:
+                previous = json.load(baseline)['results']
+        regressions = self.report(results, previous)
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'Регрессии: {", ".join(regressions)}')
+
+    def cookies(self, reader):
+        """Cookie сессии и CSRF-токен для авторизованных запросов."""
+        client = Client()
+        client.force_login(reader)
+        request = HttpRequest()
+        token = get_token(request)
+        return {
+            'HTTP_COOKIE': (
+                f'{settings.SESSION_COOKIE_NAME}='
+                f'{client.cookies[settings.SESSION_COOKIE_NAME].value}; '
+                f'{settings.CSRF_COOKIE_NAME}={request.META["CSRF_COOKIE"]}'
+            ),
+            'HTTP_X_CSRFTOKEN': token,
+        }
+
+    def scenarios(self):
+        reader, author, group, post = busiest_targets(
+            self.options['username']
+        )
+        requests = {
+            'index': ('GET', reverse('posts:index'), None),
+            'group_posts': ('GET', reverse('posts:group_posts',
+                                           args=[group.slug]), None),
+            'profile': ('GET', reverse('posts:profile',
+                                       args=[author.username]), None),
+            'post_detail': ('GET', reverse('posts:post_detail',
+                                           args=[post.pk]), None),
+            'follow_index': ('GET', reverse('posts:follow_index'), None),
+            'add_comment': ('POST', reverse('posts:add_comment',
+                                            args=[post.pk]),
+                            {'text': 'Комментарий из бенчмарка'}),
+        }
+        users = {'anonymous': {}, 'authenticated': self.cookies(reader)}
+        for view in self.options['views']:
+            method, path, data = requests[view]
+            for user, cookies in users.items():
+                if user == 'anonymous' and view in LOGIN_REQUIRED:
+                    continue
+                for state in ('cold', 'warm'):
+                    yield Scenario(view, method, path, data, user, state,
+                                   cookies)
+
+    def measure(self, scenario):
+        concurrency = self.options['concurrency']
+        requests = self.options['requests']
+        warmup = self.options['warmup'] if scenario.cache == 'warm' else 0
+        shares = [requests // concurrency + (worker < requests % concurrency)
+                  for worker in range(concurrency)]
+        start = time.perf_counter()
+        if concurrency == 1:
+            batches = [run_worker(scenario, requests, warmup)]
+        else:
+            if self.options['mode'] == 'processes':
+                connections.close_all()
+                executor = ProcessPoolExecutor(max_workers=concurrency)
+            else:
+                executor = ThreadPoolExecutor(max_workers=concurrency)
+            with executor:
+                batches = list(executor.map(
+                    run_pooled, [scenario] * concurrency, shares,
+                    [warmup] * concurrency
+                ))
+        elapsed = time.perf_counter() - start
+        latencies = [latency for batch, _ in batches for latency in batch]
+        result = {
+            f'p{rank}': round(percentile(latencies, rank) * 1000, 2)
+            for rank in PERCENTILES
+        }
+        result['rps'] = round(len(latencies) / elapsed, 1)
+        result['errors'] = sum(errors for _, errors in batches)
+        return result
+
+    def report(self, results, previous):
+        """Печатает результаты и возвращает сценарии с ростом p95."""
+        regressions = []
+        for name, result in results.items():
+            line = (f'{name}: p50 {result["p50"]} ms, p95 {result["p95"]} ms,'
+                    f' p99 {result["p99"]} ms, {result["rps"]} rps,'
+                    f' ошибок {result["errors"]}')
+            before = previous.get(name)
+            if before is None or not before['p95']:
+                self.stdout.write(line)
+                continue
+            growth = result['p95'] / before['p95'] - 1
+            line += f', p95 {growth:+.0%}'
+            if growth > self.options['threshold']:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        return regressions
@@ -0,0 +1,85 @@
+from django.core.exceptions import FieldError
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+from posts.bulk import Bulk
+from posts.models import Comment, Group, Post
+
+
+ACTIONS = ('move-group', 'clear-images', 'delete-posts', 'delete-comments')
+
+
+def lookups(pairs):
+    """Фильтры вида поле__lookup=значение."""
+    filters = {}
+    for pair in pairs:
+        field, separator, value = pair.partition('=')
+        if not separator:
+            raise CommandError(f'Фильтр без значения: {pair}')
+        filters[field] = value
+    return filters
+
+
+class Command(BaseCommand):
+    help = ('Массово переносит посты в группу, убирает картинки или '
+            'удаляет посты и комментарии по фильтру: пачками, одним '
+            'UPDATE или DELETE на пачку, без save() по одному.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=ACTIONS)
+        parser.add_argument(
+            '--filter', action='append', default=[], dest='filters',
+            help='Фильтр queryset, например author__username=leo; '
+                 'можно повторять'
+        )
+        parser.add_argument('--search',
+                            help='Только найденные полнотекстовым поиском')
+        parser.add_argument(
+            '--group',
+            help='Адрес группы для move-group; пустой — убрать из групп'
+        )
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать подходящие строки')
+
+    def handle(self, *args, **options):
+        action = options['action']
+        comments = action == 'delete-comments'
+        try:
+            rows = (Comment if comments else Post).objects.filter(
+                **lookups(options['filters'])
+            )
+        except (FieldError, ValueError) as error:
+            raise CommandError(f'Неверный фильтр: {error}')
+        if options['search']:
+            rows = rows.filter(pk__in=search.matching_ids(options['search'],
+                                                          comments))
+        if options['dry_run']:
+            self.stdout.write(f'Подходит строк: {rows.count()}')
+            return
+        bulk = Bulk(batch_size=options['batch_size'], report=self.report)
+        if action == 'move-group':
+            bulk.move_to_group(rows, self.group_id(options['group']))
+        elif action == 'clear-images':
+            bulk.clear_images(rows)
+        elif action == 'delete-posts':
+            bulk.posts(rows)
+        else:
+            bulk.comments(rows)
+        summary = ', '.join(f'{step} {count}'
+                            for step, count in bulk.counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Готово: {summary or "0"}'))
+
+    def group_id(self, slug):
+        if slug is None:
+            raise CommandError('Укажите --group; пустой адрес убирает '
+                               'посты из групп')
+        if not slug:
+            return None
+        group = Group.objects.filter(slug=slug).first()
+        if group is None:
+            raise CommandError(f'Нет группы {slug}')
+        return group.pk
+
+    def report(self, step, total):
+        self.stdout.write(f'  {step}: {total}')
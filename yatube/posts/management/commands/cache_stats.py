@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.feeds import feed_stats
+from posts.fragments import fragment_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает счётчики путей сборки ленты и кэша фрагментов.'
+
+    def handle(self, *args, **options):
+        for path, total in feed_stats().items():
+            self.stdout.write(f'feed {path}: {total}')
+        for kind, outcomes in fragment_stats().items():
+            self.stdout.write(
+                f'fragment {kind}: hit {outcomes["hit"]}, '
+                f'miss {outcomes["miss"]}'
+            )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts import deletion
+
+
+class Command(BaseCommand):
+    help = ('Удаляет пользователей, группы или посты со всем каскадом '
+            'пачками в коротких транзакциях и печатает ход удаления.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(deletion.DELETERS))
+        parser.add_argument('ids', nargs='+', type=int)
+        parser.add_argument('--batch-size', type=int,
+                            help='Строк в одной транзакции')
+        parser.add_argument('--pause', type=float,
+                            help='Пауза между пачками, в секундах')
+
+    def handle(self, *args, **options):
+        for pk in options['ids']:
+            deleted = deletion.delete(
+                options['kind'], pk, batch_size=options['batch_size'],
+                pause=options['pause'], report=self.report
+            )
+            summary = ', '.join(f'{step} {count}'
+                                for step, count in deleted.items())
+            self.stdout.write(self.style.SUCCESS(
+                f'{options["kind"]} {pk}: {summary}'
+            ))
+
+    def report(self, step, total):
+        self.stdout.write(f'  {step}: {total}')
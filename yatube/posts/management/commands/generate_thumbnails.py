@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import sharding, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Заранее создаёт миниатюры картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Только посты, у которых миниатюры ещё не готовы'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=settings.THUMBNAIL_WORKERS,
+            help='Количество потоков'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if options['missing']:
+            posts = posts.filter(thumbnail_ready=False)
+        post_ids = [
+            pk for alias in sharding.shards()
+            for pk in sharding.on_shard(posts, alias).values_list(
+                'pk', flat=True
+            )
+        ]
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                done = sum(pool.map(thumbnails.run, post_ids))
+        else:
+            done = sum(map(thumbnails.generate, post_ids))
+        self.stdout.write(self.style.SUCCESS(f'Обработано постов: {done}'))
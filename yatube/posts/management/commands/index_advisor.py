@@ -0,0 +1,104 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.management.targets import busiest_targets
+
+
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+PROBLEMS = (
+    ('полный просмотр', lambda detail: (
+        detail.startswith('SCAN ') and ' USING ' not in detail
+        and 'CONSTANT ROW' not in detail
+    )),
+    ('сортировка во временном B-дереве',
+     lambda detail: 'USE TEMP B-TREE' in detail),
+)
+
+
+class QueryRecorder:
+    """Запоминает SELECT-запросы вместе с параметрами."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT') and not many:
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def problems(plan):
+    """Проблемы плана; полнотекстовый индекс сортирует по rank сам."""
+    if any('VIRTUAL TABLE' in detail for detail in plan):
+        return []
+    return [(kind, detail) for detail in plan
+            for kind, matches in PROBLEMS if matches(detail)]
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет запросы страниц через EXPLAIN QUERY PLAN и '
+            'показывает полные просмотры таблиц и сортировки '
+            'во временном B-дереве.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username',
+                            help='Пользователь для ленты подписок')
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Завершиться ошибкой, если найдены проблемы'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN есть только в SQLite')
+        targets = busiest_targets(options['username'])
+        client = Client()
+        client.force_login(targets.reader)
+        pages = {
+            'index': reverse('posts:index'),
+            'group_posts': reverse('posts:group_posts',
+                                   args=[targets.group.slug]),
+            'profile': reverse('posts:profile',
+                               args=[targets.author.username]),
+            'post_detail': reverse('posts:post_detail',
+                                   args=[targets.post.pk]),
+            'follow_index': reverse('posts:follow_index'),
+            'search': reverse('posts:search') + '?q=' + (
+                targets.post.text.split() or ['пост']
+            )[0],
+        }
+        found = 0
+        for view, url in pages.items():
+            found += self.advise(view, client, url)
+        if found and options['strict']:
+            raise CommandError(f'Найдено проблем: {found}')
+        self.stdout.write(self.style.SUCCESS(f'Найдено проблем: {found}'))
+
+    def advise(self, view, client, url):
+        """Печатает проблемные планы страницы и возвращает их число."""
+        recorder = QueryRecorder()
+        with override_settings(CACHES=NO_CACHE), \
+                connection.execute_wrapper(recorder):
+            client.get(url)
+        unique = dict.fromkeys(
+            (sql, tuple(params or ())) for sql, params in recorder.queries
+        )
+        self.stdout.write(f'{view}: запросов {len(unique)}')
+        found = 0
+        for sql, params in unique:
+            for kind, detail in problems(explain(sql, params)):
+                found += 1
+                self.stdout.write(self.style.WARNING(
+                    f'  {kind}: {detail}\n    {sql}'
+                ))
+        return found
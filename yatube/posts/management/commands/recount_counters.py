@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount_all
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает хранимые счётчики постов, комментариев '
+            'и подписок и исправляет расхождения.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = recount_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: {drift}'
+        ))
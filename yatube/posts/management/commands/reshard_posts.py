@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from posts import sharding
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Переносит посты и их комментарии на шарды, положенные '
+            'авторам по текущему POST_SHARDS. Базы из '
+            'POST_SHARD_DATABASES должны быть уже смигрированы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать посты, которые нужно перенести'
+        )
+
+    def handle(self, *args, **options):
+        moved_posts = moved_comments = 0
+        for source in sharding.shard_databases():
+            for author_id, target in sharding.misplaced_authors(
+                source
+            ).items():
+                post_ids = list(
+                    Post.objects.using(source).filter(author_id=author_id)
+                    .order_by('pk').values_list('pk', flat=True)
+                )
+                if options['dry_run']:
+                    moved_posts += len(post_ids)
+                    continue
+                size = options['batch_size']
+                for start in range(0, len(post_ids), size):
+                    posts, comments = sharding.move_posts(
+                        source, target, post_ids[start:start + size]
+                    )
+                    moved_posts += posts
+                    moved_comments += comments
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'Нужно перенести постов: {moved_posts}'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено постов: {moved_posts}, '
+            f'комментариев: {moved_comments}'
+        ))
@@ -0,0 +1,228 @@
+import io
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from posts import counters, search, thumbnails
+from posts.models import Comment, Follow, Group, Post, User
+
+
+def skewed(rng, size, alpha):
+    """Индекс в [0, size) со степенным перекосом к началу диапазона."""
+    return min(int(size * rng.random() ** alpha), size - 1)
+
+
+def batched(objects, size):
+    objects = iter(objects)
+    batch = list(islice(objects, size))
+    while batch:
+        yield batch
+        batch = list(islice(objects, size))
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключает auto_now и auto_now_add, чтобы сохранить свои даты."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу большим объёмом правдоподобных данных '
+            'со степенным распределением подписчиков и постов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000)
+        parser.add_argument('--groups', type=int, default=2000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=3000000)
+        parser.add_argument('--follows', type=int, default=2000000)
+        parser.add_argument(
+            '--images', type=float, default=0,
+            help='Доля постов с картинкой, от 0 до 1'
+        )
+        parser.add_argument(
+            '--image-pool', type=int, default=20,
+            help='Сколько разных картинок сгенерировать'
+        )
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить посты')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='load',
+            help='Префикс имён пользователей и адресов групп'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.now = timezone.now()
+
+        self.insert(User, self.users(), options['users'])
+        self.user_ids = list(
+            User.objects.filter(username__startswith=options['prefix'])
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        self.insert(Group, self.groups(), options['groups'])
+        self.group_ids = list(
+            Group.objects.filter(slug__startswith=f'{options["prefix"]}-')
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        self.images = self.image_pool()
+        first_post = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        with explicit_dates(Post._meta.get_field('pub_date'),
+                            Post._meta.get_field('updated')):
+            self.insert(Post, self.posts(), options['posts'])
+        last_post = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        self.post_ids = range(first_post, last_post + 1)
+        with explicit_dates(Comment._meta.get_field('created')):
+            self.insert(Comment, self.comments(), options['comments'])
+        self.insert(Follow, self.follows(), options['follows'])
+        self.rebuild_derived()
+
+    def insert(self, model, objects, total):
+        """Вставляет пачками; уже существующие строки не считаются."""
+        before = model.objects.count()
+        for batch in batched(objects, self.options['batch_size']):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+        created = model.objects.count() - before
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {created} '
+                          f'из {total}')
+
+    def users(self):
+        password = make_password(None)
+        for number in range(self.options['users']):
+            yield User(
+                username=f'{self.options["prefix"]}{number}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                password=password
+            )
+
+    def groups(self):
+        for number in range(self.options['groups']):
+            yield Group(
+                title=self.fake.catch_phrase()[:200],
+                slug=f'{self.options["prefix"]}-{number}',
+                description=self.fake.sentence()
+            )
+
+    def image_pool(self):
+        """Небольшой набор картинок, общий для всех постов с картинкой.
+
+        Миниатюры каждой картинки создаются один раз, и посты с ней
+        сразу готовы к показу.
+        """
+        if not self.options['images']:
+            return []
+        names = []
+        for number in range(self.options['image_pool']):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            content = io.BytesIO()
+            Image.new('RGB', (1200, 800), color).save(content, 'PNG')
+            name = default_storage.save(
+                f'posts/{self.options["prefix"]}-{number}.png',
+                ContentFile(content.getvalue())
+            )
+            thumbnails.render(name)
+            names.append(name)
+        return names
+
+    def dates(self, total):
+        """Возрастающие даты за последние --days дней со случайным шагом."""
+        date = self.now - timedelta(days=self.options['days'])
+        step = timedelta(days=self.options['days']) / max(total, 1)
+        for _ in range(total):
+            date += step * 2 * self.rng.random()
+            yield min(date, self.now)
+
+    def posts(self):
+        users, groups = len(self.user_ids), len(self.group_ids)
+        for pub_date in self.dates(self.options['posts']):
+            group_id = None
+            if groups and self.rng.random() < 0.5:
+                group_id = self.group_ids[skewed(self.rng, groups, 2)]
+            image = ''
+            if self.images and self.rng.random() < self.options['images']:
+                image = self.rng.choice(self.images)
+            yield Post(
+                text=self.fake.paragraph(nb_sentences=3),
+                author_id=self.user_ids[skewed(self.rng, users, 3)],
+                group_id=group_id,
+                image=image,
+                thumbnail_ready=bool(image),
+                pub_date=pub_date,
+                updated=pub_date
+            )
+
+    def comments(self):
+        users, posts = len(self.user_ids), len(self.post_ids)
+        if not posts:
+            return
+        for created in self.dates(self.options['comments']):
+            yield Comment(
+                text=self.fake.sentence(),
+                post_id=self.post_ids[posts - 1 - skewed(self.rng, posts, 2)],
+                author_id=self.user_ids[skewed(self.rng, users, 1.5)],
+                created=created
+            )
+
+    def follows(self):
+        """Подписки по одному подписчику за раз: память не растёт.
+
+        Число подписок у пользователя распределено по Парето,
+        а авторы выбираются со степенным перекосом к популярным.
+        """
+        users = len(self.user_ids)
+        if users < 2:
+            return
+        remaining = self.options['follows']
+        average = remaining / users
+        for user_id in self.user_ids:
+            if remaining <= 0:
+                return
+            wanted = min(int(average * self.rng.paretovariate(2) / 2),
+                         users - 1, remaining)
+            authors = set()
+            for _ in range(wanted * 3):
+                if len(authors) >= wanted:
+                    break
+                author_id = self.user_ids[skewed(self.rng, users, 3)]
+                if author_id != user_id:
+                    authors.add(author_id)
+            remaining -= len(authors)
+            for author_id in sorted(authors):
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    def rebuild_derived(self):
+        """bulk_create не шлёт сигналов: счётчики, ленты и поиск — заново."""
+        drift = counters.recount_all()
+        self.stdout.write(f'Исправлено счётчиков: {drift}')
+        call_command('rebuild_timelines', stdout=self.stdout)
+        with transaction.atomic():
+            search.rebuild()
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS('Данные созданы'))
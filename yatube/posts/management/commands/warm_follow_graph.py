@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import follow_graph
+
+
+class Command(BaseCommand):
+    help = 'Загружает в кэш подписки всех пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько пользователей записывать в кэш за раз'
+        )
+
+    def handle(self, *args, **options):
+        warmed = follow_graph.warm(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено подписчиков: {warmed}'
+        ))
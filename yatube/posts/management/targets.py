@@ -0,0 +1,35 @@
+from collections import namedtuple
+
+from django.core.management.base import CommandError
+
+from posts.models import Group, Post, User, UserStats
+
+
+Targets = namedtuple('Targets', ['reader', 'author', 'group', 'post'])
+
+
+def busiest_user(counter):
+    stats = UserStats.objects.select_related('user').order_by(
+        f'-{counter}'
+    ).first()
+    return stats and stats.user
+
+
+def busiest_targets(username=None):
+    """Самые нагруженные объекты базы: на них виден худший случай.
+
+    reader — пользователь с наибольшим числом подписок или username,
+    author — автор с наибольшим числом постов.
+    """
+    post = Post.objects.order_by('-comments_count', '-pk').first()
+    group = Group.objects.order_by('-posts_count', '-pk').first()
+    if post is None or group is None:
+        raise CommandError('Нет данных: сначала запустите seed_load')
+    if username:
+        reader = User.objects.filter(username=username).first()
+        if reader is None:
+            raise CommandError(f'Нет пользователя {username}')
+    else:
+        reader = busiest_user('following_count') or post.author
+    author = busiest_user('posts_count') or post.author
+    return Targets(reader, author, group, post)
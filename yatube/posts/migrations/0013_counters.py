@@ -0,0 +1,75 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:05
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def related_count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by().values(field)
+            .annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        Value(0)
+    )
+
+
+def recount(apps, schema_editor):
+    """Заполняет счётчики по историческим моделям, одним UPDATE на таблицу."""
+    db = schema_editor.connection.alias
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model('posts', 'Post')
+    Group = apps.get_model('posts', 'Group')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.using(db).bulk_create(
+        [UserStats(user_id=pk)
+         for pk in User.objects.using(db).values_list('pk', flat=True)],
+        batch_size=500
+    )
+    Post.objects.using(db).update(
+        comments_count=related_count(Comment, 'post')
+    )
+    Group.objects.using(db).update(posts_count=related_count(Post, 'group'))
+    UserStats.objects.using(db).update(
+        posts_count=related_count(Post, 'author'),
+        followers_count=related_count(Follow, 'author'),
+        following_count=related_count(Follow, 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0012_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.IntegerField(default=0, verbose_name='Количество постов')),
+                ('followers_count', models.IntegerField(default=0, verbose_name='Количество подписчиков')),
+                ('following_count', models.IntegerField(default=0, verbose_name='Количество подписок')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(recount, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE VIRTUAL TABLE posts_search USING fts5("
+                "text, post_id UNINDEXED, tokenize = 'unicode61')",
+                'INSERT INTO posts_search (rowid, text, post_id) '
+                'SELECT id * 2, text, id FROM posts_post',
+                'INSERT INTO posts_search (rowid, text, post_id) '
+                'SELECT id * 2 + 1, text, post_id FROM posts_comment',
+            ],
+            reverse_sql='DROP TABLE posts_search',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:12
+
+from django.db import migrations, models
+
+
+def keep_existing_images(apps, schema_editor):
+    """Старые картинки уменьшаются при первом показе, как и раньше.
+
+    Заранее их обрабатывает команда generate_thumbnails.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.exclude(image='').update(thumbnail_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Миниатюры готовы'),
+        ),
+        migrations.RunPython(keep_existing_images,
+                             migrations.RunPython.noop),
+    ]
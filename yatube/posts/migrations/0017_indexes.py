@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:27
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def follow_count(Follow, field):
+    return Coalesce(
+        Subquery(
+            Follow.objects.filter(**{field: OuterRef('pk')})
+            .order_by().values(field)
+            .annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        Value(0)
+    )
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """Оставляет первую из повторных подписок, иначе UNIQUE не создать.
+
+    Счётчики подписок пересчитываются по историческим моделям.
+    """
+    db = schema_editor.connection.alias
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    first = Follow.objects.using(db).values('user', 'author').annotate(
+        first=Min('pk')
+    ).values('first')
+    duplicates = Follow.objects.using(db).exclude(pk__in=first)
+    if duplicates.exists():
+        duplicates.delete()
+        UserStats.objects.using(db).update(
+            followers_count=follow_count(Follow, 'author'),
+            following_count=follow_count(Follow, 'user'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_thumbnail_ready'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_date_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_follows,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_author'),
+        ),
+    ]
@@ -6,16 +6,53 @@ from django.db import models
 User = get_user_model()
 
 
-class Group(models.Model):
+class ManagedFieldsMixin:
+    """Не перезаписывает служебные поля при обычном save() существующей записи.
+
+    Счётчики и флаги меняются только точечными UPDATE (posts.counters,
+    posts.thumbnails), и устаревший экземпляр не должен их затирать.
+    """
+    managed_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.managed_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class RoutedQuerySet(models.QuerySet):
+    """create() без явной базы отдаёт роутеру сам объект.
+
+    Обычный create() выбирает базу до создания объекта, и роутер
+    не может разложить посты по шардам авторов.
+    """
+
+    def create(self, **kwargs):
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+
+class Group(ManagedFieldsMixin, models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(db_index=True, unique=True)
     description = models.TextField()
+    posts_count = models.IntegerField('Количество постов', default=0,
+                                      editable=False)
+
+    managed_fields = ('posts_count',)
 
     def __str__(self) -> str:
         return self.title
 
 
-class Post(models.Model):
+class Post(ManagedFieldsMixin, models.Model):
     text = models.TextField('Текст поста', help_text='Введите текст поста')
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
     author = models.ForeignKey(
@@ -38,9 +75,26 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.IntegerField('Количество комментариев',
+                                         default=0, editable=False)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+    thumbnail_ready = models.BooleanField('Миниатюры готовы', default=False,
+                                          editable=False)
+
+    managed_fields = ('comments_count', 'thumbnail_ready')
+
+    objects = RoutedQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:settings.LIMIT_CHAR_STR]
@@ -60,6 +114,13 @@ class Comment(models.Model):
     text = models.TextField('Текст комментария', help_text='Введите текст')
     created = models.DateTimeField('Дата коментария', auto_now_add=True)
 
+    objects = RoutedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created'], name='comment_created_idx'),
+        ]
+
     def __str__(self):
         return self.text[:settings.LIMIT_CHAR_STR]
 
@@ -78,5 +139,52 @@ class Follow(models.Model):
     )
 
     class Meta:
-        models.UniqueConstraint(fields=['user', 'author'],
-                                name='unique_author')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_author'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.DO_NOTHING,
+        related_name='timeline_entries',
+        db_constraint=False
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.IntegerField('Количество постов', default=0)
+    followers_count = models.IntegerField('Количество подписчиков',
+                                          default=0)
+    following_count = models.IntegerField('Количество подписок', default=0)
+
+
+class IdSequence(models.Model):
+    """Последний выданный id модели, общий для всех шардов."""
+    name = models.CharField(max_length=100, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
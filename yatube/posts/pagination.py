@@ -0,0 +1,211 @@
+import base64
+from datetime import datetime
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import SimpleLazyObject, cached_property
+
+
+def encode_cursor(pub_date, pk):
+    """Упаковывает ключ (pub_date, id) в непрозрачный токен."""
+    raw = f'{pub_date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора, для битого токена возвращает None."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        pub_date, pk = raw.split('|')
+        return datetime.fromisoformat(pub_date), int(pk)
+    except ValueError:
+        return None
+
+
+class FeedPaginator(Paginator):
+    """Paginator, который может отдавать на странице связанный объект.
+
+    Например, для строк ленты TimelineEntry с item='post' на странице
+    окажутся сами посты. Страниц не больше max_page: дальние номера
+    не попадают в ссылки и отдают последнюю доступную страницу.
+    """
+
+    def __init__(self, object_list, per_page, item=None, total=None,
+                 max_page=None):
+        super().__init__(object_list, per_page)
+        self.item = item
+        self.max_page = max_page
+        if total is not None:
+            self.count = total
+
+    @cached_property
+    def count(self):
+        """Строки считаются не дальше max_page страниц."""
+        if self.max_page is None:
+            return super().count
+        return self.object_list[:self.max_page * self.per_page].count()
+
+    @cached_property
+    def num_pages(self):
+        pages = super().num_pages
+        if self.max_page is None:
+            return pages
+        return min(pages, self.max_page)
+
+    def items(self, rows):
+        if self.item is None:
+            return rows
+        return [getattr(row, self.item) for row in rows]
+
+    def _get_page(self, object_list, number, paginator):
+        return Page(self.items(object_list), number, paginator)
+
+
+class CursorPaginator(FeedPaginator):
+    """Постраничный вывод по ключу (pub_date, id) без COUNT и OFFSET.
+
+    Выбирает per_page + 1 строку: лишняя строка только сообщает,
+    есть ли следующая страница. Строки выбираются при первом обращении
+    к странице, поэтому попадание во фрагментный кэш шаблона не
+    обращается к базе.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, key=('pub_date', 'pk'),
+                 item=None):
+        self.date_field, self.pk_field = key
+        super().__init__(
+            object_list.order_by(f'-{self.date_field}', f'-{self.pk_field}'),
+            per_page,
+            item
+        )
+        self.params = {}
+        self.selected = None
+
+    @property
+    def rows(self):
+        return self.load()[0]
+
+    @property
+    def has_previous(self):
+        return self.load()[1]
+
+    @property
+    def has_next(self):
+        return self.load()[2]
+
+    @property
+    def count(self):
+        return len(self.rows)
+
+    @property
+    def num_pages(self):
+        return 1
+
+    @property
+    def next_cursor(self):
+        return self.encode(self.rows[-1]) if self.rows else None
+
+    @property
+    def previous_cursor(self):
+        return self.encode(self.rows[0]) if self.rows else None
+
+    def encode(self, row):
+        return encode_cursor(getattr(row, self.date_field),
+                             getattr(row, self.pk_field))
+
+    def older_than(self, cursor):
+        pub_date, pk = cursor
+        return (Q(**{f'{self.date_field}__lt': pub_date})
+                | Q(**{self.date_field: pub_date,
+                       f'{self.pk_field}__lt': pk}))
+
+    def newer_than(self, cursor):
+        pub_date, pk = cursor
+        return (Q(**{f'{self.date_field}__gt': pub_date})
+                | Q(**{self.date_field: pub_date,
+                       f'{self.pk_field}__gt': pk}))
+
+    def fetch(self, limit, after=None, before=None, offset=0):
+        """Выбирает до limit строк; для before — от старых к новым."""
+        return self.fetch_from(self.object_list, limit, after, before,
+                               offset)
+
+    def fetch_from(self, rows, limit, after=None, before=None, offset=0):
+        if before is not None:
+            return list(rows.filter(self.newer_than(before)).reverse()[:limit])
+        if after is not None:
+            rows = rows.filter(self.older_than(after))
+        return list(rows[offset:offset + limit])
+
+    def select(self, after=None, before=None, offset=0):
+        """Возвращает (строки, есть предыдущая, есть следующая)."""
+        rows = self.fetch(self.per_page + 1, after, before, offset)
+        if before is not None:
+            if len(rows) <= self.per_page:
+                return self.select()
+            return rows[:self.per_page][::-1], True, True
+        page_rows = rows[:self.per_page]
+        if not page_rows and offset > 0:
+            return self.last_page(offset)
+        has_previous = bool(page_rows) and (after is not None or offset > 0)
+        return page_rows, has_previous, len(rows) > self.per_page
+
+    def last_page(self, offset):
+        """Последняя страница ленты, которая короче смещения ?page=.
+
+        Как Paginator.get_page: номер за концом ленты — её конец.
+        """
+        rows = self.fetch(offset)
+        start = max(len(rows) - 1, 0) // self.per_page * self.per_page
+        return rows[start:], start > 0, False
+
+    def load(self):
+        if self.selected is None:
+            self.selected = self.select(**self.params)
+        return self.selected
+
+    def cursor_page(self, after=None, before=None, offset=0):
+        self.params = {'after': after, 'before': before, 'offset': offset}
+        self.selected = None
+        return Page(SimpleLazyObject(lambda: self.items(self.rows)), 1, self)
+
+
+def page_offset(page_number, per_page, max_page):
+    """Смещение для номера ?page=, ограниченного сверху max_page."""
+    try:
+        number = int(page_number)
+    except (TypeError, ValueError):
+        number = 1
+    return (min(max(number, 1), max_page) - 1) * per_page
+
+
+def get_cursor_page(paginator, query, max_page):
+    """Возвращает страницу курсорного paginator по параметрам запроса."""
+    page_number = query.get('page')
+    if page_number is not None:
+        return paginator.cursor_page(
+            offset=page_offset(page_number, paginator.per_page, max_page)
+        )
+    after = decode_cursor(query.get('after', ''))
+    if after is not None:
+        return paginator.cursor_page(after=after)
+    return paginator.cursor_page(before=decode_cursor(query.get('before', '')))
+
+
+def get_page(query, rows, per_page, max_page, key=('pub_date', 'pk'),
+             item=None, total=None):
+    """Возвращает страницу ленты по параметрам запроса.
+
+    ?after= и ?before= работают в режиме курсора. Старые ссылки ?page=N
+    обслуживает обычный Paginator не дальше max_page страниц: и ссылки,
+    и номера за пределом ведут на страницу max_page. Если известен
+    хранимый счётчик total, Paginator не считает строки сам.
+    """
+    page_number = query.get('page')
+    if page_number is not None:
+        return FeedPaginator(rows, per_page, item, total,
+                             max_page).get_page(page_number)
+    paginator = CursorPaginator(rows, per_page, key, item)
+    return get_cursor_page(paginator, query, max_page)
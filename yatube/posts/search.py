@@ -0,0 +1,178 @@
+import base64
+from collections import namedtuple
+from itertools import islice
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import sharding
+from .models import Comment, Post
+
+
+SEARCH_TABLE = 'posts_search'
+MARK_START = '\x02'
+MARK_END = '\x03'
+REBUILD_BATCH = 5000
+
+SearchHit = namedtuple('SearchHit', ['rowid', 'rank', 'post_id', 'snippet'])
+
+
+def post_rowid(pk):
+    """Посты и комментарии живут в одной таблице: чётные rowid — посты."""
+    return pk * 2
+
+
+def comment_rowid(pk):
+    return pk * 2 + 1
+
+
+def is_comment(rowid):
+    return rowid % 2 == 1
+
+
+def match_expression(query):
+    """Превращает ввод пользователя в безопасный запрос FTS5 из фраз."""
+    terms = ['"{}"'.format(term.replace('"', '""')) for term in query.split()]
+    return ' '.join(terms)
+
+
+def replace(rowid, text, post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                       [rowid])
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, text, post_id) '
+            f'VALUES (%s, %s, %s)',
+            [rowid, text, post_id]
+        )
+
+
+def remove(*rowids):
+    if not rowids:
+        return
+    placeholders = ', '.join(['%s'] * len(rowids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+            rowids
+        )
+
+
+def index_post(post):
+    replace(post_rowid(post.pk), post.text, post.pk)
+
+
+def index_comment(comment):
+    replace(comment_rowid(comment.pk), comment.text, comment.post_id)
+
+
+def remove_post(pk):
+    remove(post_rowid(pk))
+
+
+def remove_comment(pk):
+    remove(comment_rowid(pk))
+
+
+def rebuild():
+    """Заполняет индекс заново двумя INSERT ... SELECT.
+
+    При шардировании посты и комментарии читаются с каждого шарда
+    и вставляются в индекс основной базы пачками.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        if sharding.is_sharded():
+            copy_shards(cursor)
+        else:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, text, post_id) '
+                f'SELECT id * 2, text, id FROM posts_post'
+            )
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, text, post_id) '
+                f'SELECT id * 2 + 1, text, post_id FROM posts_comment'
+            )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"
+        )
+
+
+def copy_shards(cursor):
+    sql = (f'INSERT INTO {SEARCH_TABLE} (rowid, text, post_id) '
+           f'VALUES (%s, %s, %s)')
+    for alias in sharding.shards():
+        posts = Post.objects.using(alias).values_list('pk', 'text')
+        comments = Comment.objects.using(alias).values_list(
+            'pk', 'text', 'post_id'
+        )
+        for batch in batched(posts.iterator(), REBUILD_BATCH):
+            cursor.executemany(sql, [(post_rowid(pk), text, pk)
+                                     for pk, text in batch])
+        for batch in batched(comments.iterator(), REBUILD_BATCH):
+            cursor.executemany(sql, [(comment_rowid(pk), text, post_id)
+                                     for pk, text, post_id in batch])
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
+
+
+def encode_cursor(hit):
+    raw = f'{hit.rank!r}|{hit.rowid}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        rank, rowid = raw.split('|')
+        return float(rank), int(rowid)
+    except ValueError:
+        return None
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(MARK_START, '<mark>')
+                     .replace(MARK_END, '</mark>'))
+
+
+def search(query, limit, after=None):
+    """Находит посты и комментарии по релевантности bm25.
+
+    Страницы идут по ключу (rank, rowid) от курсора after.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+    sql = (
+        f"SELECT rowid, rank, post_id, "
+        f"snippet({SEARCH_TABLE}, 0, %s, %s, '…', 12) "
+        f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s"
+    )
+    params = [MARK_START, MARK_END, expression]
+    if after is not None:
+        sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [SearchHit(rowid, rank, post_id, highlight(snippet))
+                for rowid, rank, post_id, snippet in cursor.fetchall()]
+
+
+def matching_ids(query, comments=False):
+    """Подзапрос id постов или комментариев для фильтра в админке."""
+    return RawSQL(
+        f'SELECT rowid / 2 FROM {SEARCH_TABLE} '
+        f'WHERE {SEARCH_TABLE} MATCH %s AND rowid %% 2 = %s',
+        [match_expression(query), int(comments)]
+    )
@@ -0,0 +1,241 @@
+"""Шардирование постов и комментариев по автору.
+
+Пост живёт на шарде shard_for(author_id), комментарии — на шарде
+своего поста, поэтому страница поста читает один шард. Пользователи,
+группы, подписки, ленты и поиск остаются в основной базе, а связи
+с ними подтягиваются prefetch_related. Пока POST_SHARDS состоит
+из одной default, всё работает как без шардирования.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, Max, prefetch_related_objects
+
+from .models import Comment, IdSequence, Post
+from .pagination import CursorPaginator, get_cursor_page
+
+
+SHARDED_MODELS = ('post', 'comment')
+LOCATION_KEY = 'shard:post:{}'
+
+
+def shards():
+    return settings.POST_SHARDS
+
+
+def is_sharded():
+    return list(shards()) != [DEFAULT_DB_ALIAS]
+
+
+def shard_databases():
+    """Все базы, где могут лежать посты, включая выводимые из кольца."""
+    return list(dict.fromkeys([*shards(), *settings.POST_SHARD_DATABASES]))
+
+
+def shard_for(author_id):
+    aliases = shards()
+    return aliases[author_id % len(aliases)]
+
+
+def on_shard(queryset, alias):
+    """using() только при шардировании: иначе решает роутер реплик."""
+    return queryset.using(alias) if is_sharded() else queryset
+
+
+def join(queryset, *fields):
+    """select_related в одной базе, prefetch_related между базами."""
+    if is_sharded():
+        return queryset.prefetch_related(*fields)
+    return queryset.select_related(*fields)
+
+
+def posts_of(author_id):
+    return on_shard(Post.objects.filter(author_id=author_id),
+                    shard_for(author_id))
+
+
+def remember(post):
+    if is_sharded():
+        cache.set(LOCATION_KEY.format(post.pk), post._state.db, None)
+
+
+def forget(*post_ids):
+    cache.delete_many([LOCATION_KEY.format(pk) for pk in post_ids])
+
+
+def locate(post_id):
+    """Шард поста: из кэша, а при промахе — опросом всех шардов.
+
+    Место хранится без срока, поэтому шарды опрашиваются явным using(),
+    мимо роутера реплик.
+    """
+    key = LOCATION_KEY.format(post_id)
+    alias = cache.get(key)
+    if alias in shard_databases():
+        return alias
+    for alias in shard_databases():
+        if Post.objects.using(alias).filter(pk=post_id).exists():
+            cache.set(key, alias, None)
+            return alias
+    return None
+
+
+def post_rows(post_id):
+    """QuerySet одного поста на его шарде."""
+    rows = Post.objects.filter(pk=post_id)
+    if not is_sharded():
+        return rows
+    alias = locate(post_id)
+    return rows.using(alias) if alias else rows.none()
+
+
+def in_bulk(post_ids, *related):
+    """Посты по id со всех шардов, связи — одним запросом на поле."""
+    if not is_sharded():
+        return Post.objects.select_related(*related).in_bulk(post_ids)
+    posts = {}
+    for alias in shards():
+        posts.update(Post.objects.using(alias).in_bulk(post_ids))
+    prefetch_related_objects(list(posts.values()), *related)
+    return posts
+
+
+def misplaced_authors(alias):
+    """Авторы постов базы alias, которым по кольцу место на другом шарде."""
+    authors = (Post.objects.using(alias).order_by()
+               .values_list('author_id', flat=True).distinct())
+    return {author_id: shard_for(author_id) for author_id in authors
+            if shard_for(author_id) != alias}
+
+
+def move_posts(source, target, post_ids):
+    """Переносит посты вместе с комментариями без сигналов.
+
+    Сначала строки вставляются в target, потом удаляются из source:
+    после сбоя между шагами повторный перенос доделает работу.
+    """
+    posts = list(Post.objects.using(source).filter(pk__in=post_ids))
+    comments = list(Comment.objects.using(source).filter(
+        post_id__in=post_ids
+    ))
+    with transaction.atomic(using=target):
+        Post.objects.using(target).bulk_create(posts, ignore_conflicts=True)
+        Comment.objects.using(target).bulk_create(comments,
+                                                  ignore_conflicts=True)
+    with transaction.atomic(using=source):
+        Comment.objects.using(source).filter(
+            post_id__in=post_ids
+        )._raw_delete(source)
+        Post.objects.using(source).filter(pk__in=post_ids)._raw_delete(source)
+    cache.set_many({LOCATION_KEY.format(pk): target for pk in post_ids},
+                   None)
+    return len(posts), len(comments)
+
+
+def allocate_ids(model, count=1):
+    """Выдаёт count подряд идущих id, уникальных на всех шардах.
+
+    Последовательность хранится в основной базе. Первая выдача
+    начинает её с наибольшего id модели на всех шардах.
+    """
+    name = model._meta.label_lower
+    sequence = IdSequence.objects.using(DEFAULT_DB_ALIAS)
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        if not sequence.filter(name=name).update(last_id=F('last_id')
+                                                 + count):
+            start = max(
+                model.objects.using(alias).aggregate(last=Max('pk'))['last']
+                or 0 for alias in shard_databases()
+            )
+            try:
+                with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                    sequence.create(name=name, last_id=start + count)
+            except IntegrityError:
+                sequence.filter(name=name).update(
+                    last_id=F('last_id') + count
+                )
+        last = sequence.get(name=name).last_id
+    return range(last - count + 1, last + 1)
+
+
+class ScatterPaginator(CursorPaginator):
+    """Курсорная лента по всем шардам.
+
+    Каждый шард отдаёт свои offset + limit строк по ключу (pub_date, id),
+    а страница собирается k-путевым слиянием. Связи строк страницы
+    подтягиваются после слияния, по одному запросу на поле.
+    """
+
+    def __init__(self, object_list, per_page, related=()):
+        super().__init__(object_list, per_page)
+        self.related = related
+
+    def fetch(self, limit, after=None, before=None, offset=0):
+        size = offset + limit
+        sources = [
+            self.fetch_from(self.object_list.using(alias), size, after,
+                            before)
+            for alias in shards()
+        ]
+        merged = heapq.merge(
+            *sources, key=lambda post: (post.pub_date, post.pk),
+            reverse=before is None
+        )
+        return list(islice(merged, offset, size))
+
+    def items(self, rows):
+        prefetch_related_objects(rows, *self.related)
+        return rows
+
+
+def scatter_page(query, posts, related, per_page, max_page):
+    return get_cursor_page(ScatterPaginator(posts, per_page, related),
+                           query, max_page)
+
+
+class ShardRouter:
+    """Запись поста — на шард автора, комментария — на шард поста.
+
+    Чтения по связям идут туда, откуда загружен объект-подсказка.
+    Остальные модели роутер оставляет следующим роутерам.
+    """
+
+    def model_name(self, model):
+        if model._meta.app_label == 'posts':
+            return model._meta.model_name
+        return None
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if (self.model_name(model) in SHARDED_MODELS and is_sharded()
+                and isinstance(instance, (Post, Comment))):
+            return instance._state.db
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not is_sharded():
+            return None
+        instance = hints.get('instance')
+        if isinstance(instance, Post) and model is Post:
+            return shard_for(instance.author_id)
+        if isinstance(instance, Comment) and model is Comment:
+            return locate(instance.post_id)
+        if isinstance(instance, Post) and model is Comment:
+            return instance._state.db
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if isinstance(obj1, (Post, Comment)) or isinstance(
+            obj2, (Post, Comment)
+        ):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """В базах шардов — только таблицы постов и комментариев."""
+        if db == DEFAULT_DB_ALIAS or db not in shard_databases():
+            return None
+        return app_label == 'posts' and model_name in SHARDED_MODELS
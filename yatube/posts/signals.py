@@ -0,0 +1,94 @@
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import (counters, feeds, follows, generations, search, sharding,
+               thumbnails, timeline)
+from .models import (Comment, Follow, Group, Post, TimelineEntry, User,
+                     UserStats)
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    """Счётчики заводятся сразу: первая подписка не вставляет строку."""
+    if created:
+        UserStats.objects.create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+def sharded_id(sender, instance, **kwargs):
+    """На шардах id выдаёт общая последовательность, а не таблица."""
+    if instance.pk is None and sharding.is_sharded():
+        instance.pk = sharding.allocate_ids(sender)[0]
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    instance._loaded_group_id = instance.group_id
+    instance._loaded_image = instance.image.name
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        sharding.remember(instance)
+        counters.bump_user(instance.author_id, posts_count=1)
+        counters.bump_group(instance.group_id, 1)
+        timeline.push_post(instance)
+    else:
+        feeds.bump_feeds(instance.author_id)
+    if not created and instance.group_id != instance._loaded_group_id:
+        counters.bump_group(instance._loaded_group_id, -1)
+        counters.bump_group(instance.group_id, 1)
+    generations.bump_post(instance, instance._loaded_group_id)
+    search.index_post(instance)
+    if instance.image and instance.image.name != instance._loaded_image:
+        if not created:
+            thumbnails.reset(instance.pk)
+        thumbnails.schedule(instance.pk)
+    instance._loaded_group_id = instance.group_id
+    instance._loaded_image = instance.image.name
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, posts_count=-1)
+    counters.bump_group(instance.group_id, -1)
+    feeds.forget_author(instance.author_id)
+    feeds.bump_feeds(instance.author_id)
+    generations.bump_post(instance)
+    search.remove_post(instance.pk)
+    TimelineEntry.objects.filter(post_id=instance.pk).delete()
+    if sharding.is_sharded():
+        sharding.forget(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    generations.bump(f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    counters.bump_post(instance.post_id, 1 if created else 0)
+    generations.bump_comments(instance.post_id)
+    search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+    generations.bump_comments(instance.post_id)
+    search.remove_comment(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        follows.followed(instance.user_id, [instance.author_id])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    follows.unfollowed(instance.user_id, [instance.author_id])
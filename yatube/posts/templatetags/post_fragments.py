@@ -0,0 +1,21 @@
+from django import template
+
+from posts import fragments
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_cards(posts, user=None):
+    fragments.prefetch_cards(posts, user)
+    return ''
+
+
+@register.simple_tag
+def post_card(post):
+    return fragments.post_card(post)
+
+
+@register.simple_tag
+def comment_list(post, comments):
+    return fragments.comment_list(post, comments)
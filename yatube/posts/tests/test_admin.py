@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.admin import IndexedDatesQuerySet
+from ..models import Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class AdminScalabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.groups = [Group.objects.create(title=f'Группа {number}',
+                                           slug=f'group-{number}')
+                      for number in range(3)]
+        for number in range(12):
+            post = Post.objects.create(author=cls.author,
+                                       group=cls.groups[number % 3],
+                                       text=f'Пост {number}')
+            pub_date = datetime(2020 + number % 3, number % 12 + 1, 5)
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=timezone.make_aware(pub_date)
+            )
+        Follow.objects.create(user=cls.admin, author=cls.author)
+        Follow.objects.create(user=cls.author, author=cls.admin)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def test_post_changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/posts/post/')
+        self.assertEqual(response.status_code, 200)
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(
+            len([query for query in sql
+                 if query.startswith('SELECT COUNT(*)')]), 1
+        )
+        self.assertEqual(
+            len([query for query in sql
+                 if 'FROM "posts_group"' in query]), 1
+        )
+        self.assertFalse([query for query in sql
+                          if 'django_datetime_trunc' in query])
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=5)
+    def test_counts_are_estimated_or_capped(self):
+        response = self.client.get('/admin/posts/post/')
+        self.assertEqual(response.context['cl'].result_count,
+                         Post.objects.order_by('-pk').first().pk)
+        response = self.client.get(
+            '/admin/posts/post/', {'author__id__exact': self.author.pk}
+        )
+        self.assertEqual(response.context['cl'].result_count, 5)
+
+    def test_indexed_dates_match_django(self):
+        rows = IndexedDatesQuerySet(Post)
+        for kind in ('year', 'month'):
+            with self.subTest(kind=kind):
+                self.assertEqual(list(rows.dates('pub_date', kind)),
+                                 list(Post.objects.dates('pub_date', kind)))
+        year = rows.filter(pub_date__year=2021)
+        self.assertEqual(list(year.dates('pub_date', 'month')),
+                         list(Post.objects.filter(pub_date__year=2021)
+                              .dates('pub_date', 'month')))
+
+    def test_autocomplete_filter(self):
+        response = self.client.get('/admin/posts/follow/')
+        self.assertContains(response, 'admin-autocomplete')
+        response = self.client.get('/admin/posts/follow/',
+                                   {'user__id__exact': self.admin.pk})
+        self.assertEqual([follow.author for follow
+                          in response.context['cl'].result_list],
+                         [self.author])
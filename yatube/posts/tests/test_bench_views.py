@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from ..counters import recount_all
+from ..models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class BenchViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.group = Group.objects.create(title='Группа', slug='bench',
+                                         description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+        recount_all()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, 'bench.json')
+
+    def bench(self, *args):
+        out = StringIO()
+        call_command('bench_views', '--requests=2', '--warmup=1',
+                     '--username=Reader', *args, stdout=out)
+        return out.getvalue()
+
+    def test_writes_percentiles_for_every_scenario(self):
+        self.bench(f'--output={self.output}')
+        with open(self.output, encoding='utf-8') as output:
+            results = json.load(output)['results']
+        self.assertEqual(len(results), 20)
+        self.assertNotIn('follow_index:anonymous:cold', results)
+        for result in results.values():
+            self.assertEqual(result['errors'], 0)
+            self.assertLessEqual(result['p50'], result['p99'])
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 5)
+
+    def test_unknown_username(self):
+        with self.assertRaisesMessage(CommandError, 'Нет пользователя Nobody'):
+            self.bench('--username=Nobody')
+
+    def test_no_requests(self):
+        with self.assertRaises(CommandError):
+            self.bench('--requests=0')
+
+    def test_reports_regressions(self):
+        self.bench('--views', 'index', f'--output={self.output}')
+        with open(self.output, encoding='utf-8') as output:
+            report = json.load(output)
+        for result in report['results'].values():
+            result['p95'] = 0.001
+        with open(self.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output)
+        with self.assertRaises(CommandError):
+            self.bench('--views', 'index', f'--compare={self.output}',
+                       '--fail-on-regression')
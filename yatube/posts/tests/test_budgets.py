@@ -0,0 +1,206 @@
+"""Бюджеты производительности для всех адресов posts.
+
+Пороги лежат в yatube/budgets.json, из него же берутся QUERY_BUDGETS
+настроек. Замеры идут в режиме QUERY_BUDGET_STRICT: адрес сверх
+бюджета падает с QueryBudgetExceeded. На Writer подписаны все
+авторы, он «тяжёлый», и /follow/ меряется со смешанной лентой.
+Главная меряется по старой ссылке ?page=, дороже курсора на COUNT.
+Чтобы записать пороги заново по текущему коду, запустите тесты
+с переменной окружения UPDATE_BUDGETS=1:
+
+    UPDATE_BUDGETS=1 python manage.py test posts.tests.test_budgets
+
+Рост времени зависит от загрузки машины и проверяется только
+с BUDGET_TIMING=1.
+"""
+import json
+import os
+import time
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import urls
+from ..models import Comment, Follow, Group, Post
+
+
+BASELINE_PATH = settings.QUERY_BUDGETS_PATH
+UPDATE_BASELINE = os.environ.get('UPDATE_BUDGETS') == '1'
+CHECK_TIMING = os.environ.get('BUDGET_TIMING') == '1'
+REPEATS = 5 if CHECK_TIMING else 1
+User = get_user_model()
+
+
+def load_baseline():
+    with open(BASELINE_PATH, encoding='utf-8') as baseline:
+        return json.load(baseline)
+
+
+def save_baseline(baseline):
+    with open(BASELINE_PATH, 'w', encoding='utf-8') as output:
+        json.dump(baseline, output, indent=2, sort_keys=True)
+        output.write('\n')
+
+
+@override_settings(FEED_HEAVY_AUTHOR_FOLLOWERS=3)
+class PerformanceBudgetTests(TestCase):
+    """Число запросов не зависит от объёма данных, время растёт медленнее."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.baseline = load_baseline()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.writer = User.objects.create_user(username='Writer')
+        cls.target = User.objects.create_user(username='Target')
+        cls.group = Group.objects.create(title='Группа', slug='budget',
+                                         description='Описание')
+        cls.old_group = Group.objects.create(title='Старая', slug='old')
+        cls.own_post = Post.objects.create(text='Свой пост',
+                                           author=cls.reader)
+        Post.objects.create(text='Пост цели', author=cls.target)
+        Follow.objects.create(user=cls.reader, author=cls.writer)
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        cls.seeded = 0
+        cls.results = {}
+        try:
+            for size in cls.baseline['sizes']:
+                cls.seed(size)
+                cls.results[size] = {route: cls.measure(route)
+                                     for route in cls.routes()}
+        except Exception:
+            super().tearDownClass()
+            raise
+        if UPDATE_BASELINE:
+            small = cls.baseline['sizes'][0]
+            cls.baseline['shards'] = len(settings.POST_SHARDS)
+            cls.baseline['queries'] = {
+                route: queries for route, (queries, _) in
+                cls.results[small].items()
+            }
+            save_baseline(cls.baseline)
+
+    @classmethod
+    def seed(cls, size):
+        """Доводит данные до size авторов, постов и подписчиков."""
+        for number in range(cls.seeded, size):
+            author = User.objects.create_user(username=f'author{number}')
+            Follow.objects.create(user=cls.reader, author=author)
+            Follow.objects.create(user=author, author=cls.writer)
+            for post_author in (author, cls.writer):
+                post = Post.objects.create(text=f'Пост {number}',
+                                           author=post_author,
+                                           group=cls.group)
+                Comment.objects.bulk_create([
+                    Comment(post=post, author=author, text='Комментарий')
+                    for _ in range(2)
+                ])
+        cls.seeded = size
+
+    @classmethod
+    def routes(cls):
+        """«Метод имя адреса» -> (URL, данные формы)."""
+        writer = {'username': cls.writer.username}
+        target = {'username': cls.target.username}
+        own_post = {'post_id': cls.own_post.pk}
+        return {
+            'GET posts:index': (reverse('posts:index'), {'page': 2}),
+            'GET posts:group_posts': (
+                reverse('posts:group_posts', kwargs={'slug': cls.group.slug}),
+                None
+            ),
+            'GET posts:profile': (
+                reverse('posts:profile', kwargs=writer), None
+            ),
+            'GET posts:post_detail': (
+                reverse('posts:post_detail', kwargs=own_post), None
+            ),
+            'GET posts:post_create': (reverse('posts:post_create'), None),
+            'POST posts:post_create': (
+                reverse('posts:post_create'),
+                {'text': 'Новый пост', 'group': cls.group.pk}
+            ),
+            'GET posts:post_edit': (
+                reverse('posts:post_edit', kwargs=own_post), None
+            ),
+            'POST posts:post_edit': (
+                reverse('posts:post_edit', kwargs=own_post),
+                {'text': 'Исправленный пост', 'group': cls.group.pk}
+            ),
+            'POST posts:add_comment': (
+                reverse('posts:add_comment', kwargs=own_post),
+                {'text': 'Новый комментарий'}
+            ),
+            'GET posts:follow_index': (reverse('posts:follow_index'), None),
+            'GET posts:search': (reverse('posts:search'), {'q': 'Пост'}),
+            'GET posts:profile_follow': (
+                reverse('posts:profile_follow', kwargs=target), None
+            ),
+            'GET posts:profile_unfollow': (
+                reverse('posts:profile_unfollow', kwargs=target), None
+            ),
+        }
+
+    @classmethod
+    def prepare(cls, route):
+        _, name = route.split()
+        following = Follow.objects.filter(user=cls.reader, author=cls.target)
+        if name == 'posts:profile_follow':
+            following.delete()
+        elif name == 'posts:profile_unfollow' and not following.exists():
+            Follow.objects.create(user=cls.reader, author=cls.target)
+        elif route == 'POST posts:post_edit':
+            Post.objects.filter(pk=cls.own_post.pk).update(
+                group=cls.old_group
+            )
+        cache.clear()
+
+    @classmethod
+    def measure(cls, route):
+        """(число запросов, лучшее время из REPEATS холодных запросов)."""
+        method, _ = route.split()
+        url, data = cls.routes()[route]
+        request = getattr(cls.reader_client, method.lower())
+        queries, best = None, None
+        with override_settings(QUERY_BUDGET_STRICT=not UPDATE_BASELINE):
+            for _ in range(REPEATS):
+                cls.prepare(route)
+                start = time.perf_counter()
+                response = request(url, data)
+                elapsed = time.perf_counter() - start
+                queries = response.wsgi_request.profile.queries
+                best = elapsed if best is None else min(best, elapsed)
+        return queries, best
+
+    def test_every_route_has_budget(self):
+        names = {f'{urls.app_name}:{pattern.name}'
+                 for pattern in urls.urlpatterns}
+        self.assertEqual({route.split()[1] for route in self.routes()},
+                         names)
+        self.assertEqual(set(self.baseline['queries']), set(self.routes()))
+
+    def test_settings_use_baseline(self):
+        self.assertEqual(settings.QUERY_BUDGETS, self.baseline['queries'])
+        self.assertEqual(settings.QUERY_BUDGET_SHARDS,
+                         self.baseline['shards'])
+
+    def test_query_counts(self):
+        for route, budget in self.baseline['queries'].items():
+            for size, results in self.results.items():
+                with self.subTest(route=route, size=size):
+                    self.assertEqual(results[route][0], budget)
+
+    @skipUnless(CHECK_TIMING, 'время проверяется с BUDGET_TIMING=1')
+    def test_time_grows_sublinearly(self):
+        small, large = self.baseline['sizes'][0], self.baseline['sizes'][-1]
+        limit = large / small * self.baseline['max_time_growth']
+        for route in self.routes():
+            with self.subTest(route=route):
+                growth = (self.results[large][route][1]
+                          / self.results[small][route][1])
+                self.assertLess(growth, limit)
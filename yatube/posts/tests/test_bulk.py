@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.contrib import messages
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .. import counters, generations, search
+from ..bulk import Bulk
+from ..models import Comment, Group, Post
+
+
+User = get_user_model()
+
+
+class BulkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Writer')
+        cls.old = Group.objects.create(title='Старая', slug='old')
+        cls.new = Group.objects.create(title='Новая', slug='new')
+        cls.posts = [
+            Post.objects.create(author=cls.author, group=cls.old,
+                                text=f'Пост {number}',
+                                image='posts/picture.png')
+            for number in range(5)
+        ]
+        for post in cls.posts:
+            Comment.objects.create(post=post, author=cls.author,
+                                   text='Спам-комментарий')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_move_to_group_updates_in_batches(self):
+        version = generations.group_version(self.new.pk, self.author)
+        with CaptureQueriesContext(connection) as queries:
+            Bulk(batch_size=2).move_to_group(Post.objects.all(), self.new.pk)
+        updates = [query for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE "posts_post"')]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(Post.objects.filter(group=self.new).count(), 5)
+        self.assertEqual(counters.recount_all(), 0)
+        self.assertNotEqual(
+            generations.group_version(self.new.pk, self.author), version
+        )
+
+    def test_clear_images(self):
+        Bulk().clear_images(Post.objects.filter(pk=self.posts[0].pk))
+        self.assertEqual(Post.objects.filter(image='').count(), 1)
+
+    def test_command_deletes_comments_by_search(self):
+        out = StringIO()
+        call_command('bulk_posts', 'delete-comments', '--search', 'Спам',
+                     '--filter', f'post__author_id={self.author.pk}',
+                     stdout=out)
+        self.assertIn('comments 5', out.getvalue())
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(search.search('Спам', 10), [])
+        self.assertEqual(counters.recount_all(), 0)
+
+    def test_command_rejects_unknown_filter_field(self):
+        for pair in ('colour=red', 'author_id=leo'):
+            with self.subTest(pair=pair):
+                with self.assertRaisesMessage(CommandError,
+                                              'Неверный фильтр'):
+                    call_command('bulk_posts', 'delete-posts',
+                                 '--filter', pair, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), len(self.posts))
+
+    def test_command_moves_posts_out_of_groups(self):
+        call_command('bulk_posts', 'move-group', '--group', '',
+                     '--filter', 'text__endswith=1', stdout=StringIO())
+        self.assertEqual(Post.objects.filter(group=None).count(), 1)
+        self.assertEqual(counters.recount_all(), 0)
+
+    def test_admin_move_to_group_action(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        self.assertContains(client.get('/admin/posts/post/'),
+                            'name="group"')
+        response = client.post('/admin/posts/post/', {
+            'action': 'move_to_group',
+            'group': self.new.pk,
+            '_selected_action': [post.pk for post in self.posts[:2]],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Post.objects.filter(group=self.new).count(), 2)
+        self.assertEqual(counters.recount_all(), 0)
+
+    def test_admin_move_to_group_requires_group(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        selected = [post.pk for post in self.posts[:2]]
+        for group in ('', 'not-a-group', 10 ** 6):
+            with self.subTest(group=group):
+                response = client.post('/admin/posts/post/', {
+                    'action': 'move_to_group', 'group': group,
+                    '_selected_action': selected,
+                }, follow=True)
+                self.assertEqual(response.status_code, 200)
+                levels = {message.level
+                          for message in response.context['messages']}
+                self.assertTrue(levels & {messages.WARNING, messages.ERROR})
+                self.assertEqual(Post.objects.filter(group=self.old).count(),
+                                 5)
+        client.post('/admin/posts/post/', {
+            'action': 'remove_from_group', '_selected_action': selected,
+        })
+        self.assertEqual(Post.objects.filter(group=None).count(), 2)
+        self.assertEqual(counters.recount_all(), 0)
@@ -0,0 +1,99 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, UserStats
+
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Rin')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.group2 = Group.objects.create(
+            title='Тестовая группа №2',
+            slug='test-slug-2',
+            description='Тестовое описание 2',
+        )
+
+    def setUp(self):
+        self.rin_client = Client()
+        self.rin_client.force_login(self.user)
+
+    def test_post_counters(self):
+        self.rin_client.post(reverse('posts:post_create'),
+                             data={'text': 'Пост', 'group': self.group.pk})
+        post = Post.objects.get(text='Пост')
+        self.assertEqual(UserStats.objects.get(user=self.user).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.rin_client.post(reverse('posts:post_edit', args=(post.pk,)),
+                             data={'text': 'Пост', 'group': self.group2.pk})
+        self.group.refresh_from_db()
+        self.group2.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.group2.posts_count, 1)
+        Post.objects.get(pk=post.pk).delete()
+        self.group2.refresh_from_db()
+        self.assertEqual(self.group2.posts_count, 0)
+        self.assertEqual(UserStats.objects.get(user=self.user).posts_count, 0)
+
+    def test_comment_counter_survives_post_edit(self):
+        post = Post.objects.create(text='Пост', author=self.user)
+        edited = Post.objects.get(pk=post.pk)
+        self.rin_client.post(reverse('posts:add_comment', args=(post.pk,)),
+                             data={'text': 'комментарий'})
+        edited.text = 'Новый текст'
+        edited.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        Comment.objects.get(post=post).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        self.rin_client.get(reverse('posts:profile_follow',
+                                    args=(self.author.username,)))
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1)
+        self.rin_client.get(reverse('posts:profile_unfollow',
+                                    args=(self.author.username,)))
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0)
+
+    def test_recount_counters_fixes_drift(self):
+        Post.objects.bulk_create([
+            Post(text='Пост', author=self.author, group=self.group)
+            for _ in range(3)
+        ])
+        Follow.objects.bulk_create([Follow(user=self.user,
+                                           author=self.author)])
+        call_command('recount_counters', stdout=StringIO())
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 3)
+        self.assertEqual(stats.followers_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 3)
+
+    def test_profile_reads_stored_counter(self):
+        Post.objects.create(text='Пост', author=self.author)
+        response = self.rin_client.get(
+            reverse('posts:profile', args=(self.author.username,))
+        )
+        self.assertContains(response, 'Всего постов: 1')
@@ -0,0 +1,103 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+
+from .. import counters, deletion, follow_graph, search
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
+
+
+User = get_user_model()
+
+
+class DeletionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Prolific')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.other = User.objects.create_user(username='Other')
+        cls.group = Group.objects.create(title='Группа', slug='big-group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.author, author=cls.other)
+        cls.posts = [
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'Удаляемый пост {number}')
+            for number in range(5)
+        ]
+        cls.other_post = Post.objects.create(author=cls.other,
+                                             group=cls.group, text='Чужой')
+        for post in cls.posts:
+            Comment.objects.create(post=post, author=cls.reader,
+                                   text='Ответ читателя')
+        for number in range(3):
+            Comment.objects.create(post=cls.other_post, author=cls.author,
+                                   text=f'Удаляемый комментарий {number}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_user_deleted_in_batches_with_consistent_counters(self):
+        reports = []
+        follow_graph.following(self.reader.pk)
+        deleted = deletion.delete(
+            'user', self.author.pk, batch_size=2,
+            report=lambda step, total: reports.append((step, total))
+        )
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
+        self.assertFalse(Post.objects.filter(author=self.author).exists())
+        self.assertFalse(Comment.objects.filter(post__in=self.posts)
+                         .exists())
+        self.assertFalse(Comment.objects.filter(author=self.author)
+                         .exists())
+        self.assertFalse(Follow.objects.filter(author=self.author).exists())
+        self.assertFalse(TimelineEntry.objects.filter(post__in=self.posts)
+                         .exists())
+        self.assertEqual(deleted['posts'], 5)
+        self.assertEqual(deleted['comments'], 8)
+        self.assertEqual(deleted['users'], 1)
+        self.assertEqual([total for step, total in reports
+                          if step == 'posts'], [2, 4, 5])
+        self.assertEqual(counters.recount_all(), 0)
+        self.assertEqual(UserStats.objects.get(user=self.other)
+                         .followers_count, 0)
+        self.assertEqual(follow_graph.following(self.reader.pk), set())
+        self.assertEqual(search.search('Удаляемый', 10), [])
+
+    def test_group_posts_are_detached_in_batches(self):
+        deleted = deletion.delete('group', self.group.pk, batch_size=4)
+        self.assertEqual(deleted['posts'], 6)
+        self.assertEqual(deleted['groups'], 1)
+        self.assertFalse(Group.objects.filter(pk=self.group.pk).exists())
+        self.assertEqual(Post.objects.filter(group=None).count(), 6)
+
+    def test_post_deleted_with_comments(self):
+        deletion.delete('post', self.other_post.pk, batch_size=2)
+        self.assertFalse(Post.objects.filter(pk=self.other_post.pk).exists())
+        self.assertFalse(Comment.objects.filter(post_id=self.other_post.pk)
+                         .exists())
+        self.assertEqual(counters.recount_all(), 0)
+
+    def test_repeated_deletion_is_harmless(self):
+        deletion.delete('post', self.other_post.pk)
+        self.assertEqual(deletion.delete('post', self.other_post.pk), {})
+
+    @override_settings(DELETION_IN_BACKGROUND=False)
+    def test_admin_action(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.post('/admin/auth/user/', {
+            'action': 'delete_in_batches',
+            '_selected_action': [self.author.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
+
+    def test_command_reports_progress(self):
+        out = StringIO()
+        call_command('delete_cascade', 'group', str(self.group.pk),
+                     '--batch-size', '4', stdout=out)
+        self.assertIn('posts: 4', out.getvalue())
+        self.assertIn('posts 6, groups 1', out.getvalue())
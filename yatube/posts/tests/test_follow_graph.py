@@ -0,0 +1,127 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import follow_graph, follows
+from ..models import Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.other = User.objects.create_user(username='Other')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_loads_lazily(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertTrue(follow_graph.is_following(self.reader.pk,
+                                                      self.author.pk))
+        with self.assertNumQueries(0):
+            self.assertFalse(follow_graph.is_following(self.reader.pk,
+                                                       self.other.pk))
+
+    def test_profile_does_not_query_follows(self):
+        client = Client()
+        client.force_login(self.reader)
+        follows.follow(self.reader.pk, self.author.pk)
+        profile_url = reverse('posts:profile', kwargs={'username': 'Writer'})
+        client.get(profile_url)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(profile_url, HTTP_CACHE_CONTROL='no-cache')
+        self.assertTrue(response.context['following'])
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'posts_follow' in query['sql']])
+
+    def test_follow_state_costs_no_per_post_queries(self):
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='Описание')
+        for number in range(5):
+            author = User.objects.create_user(username=f'author{number}')
+            Post.objects.create(text='Пост', author=author, group=group)
+        client = Client()
+        client.force_login(self.reader)
+        follow_graph.following(self.reader.pk)
+        for url in (reverse('posts:index'),
+                    reverse('posts:group_posts', kwargs={'slug': 'group'})):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            self.assertContains(response, 'Подписаться', count=5)
+            self.assertFalse([query for query in queries.captured_queries
+                              if 'posts_follow' in query['sql']])
+
+    def test_warm_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        cache.clear()
+        out = StringIO()
+        call_command('warm_follow_graph', '--batch-size=1', stdout=out)
+        self.assertIn('Загружено подписчиков: 2', out.getvalue())
+        with self.assertNumQueries(0):
+            self.assertEqual(follow_graph.following(self.other.pk),
+                             {self.author.pk})
+
+
+class FollowGraphUpdateTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='Reader')
+        self.author = User.objects.create_user(username='Writer')
+        self.other = User.objects.create_user(username='Other')
+
+    def test_follow_updates_cached_graph(self):
+        follow_graph.following(self.reader.pk)
+        follows.follow(self.reader.pk, self.author.pk)
+        follows.follow_many([(self.reader.pk, self.other.pk)])
+        with self.assertNumQueries(0):
+            self.assertEqual(follow_graph.following(self.reader.pk),
+                             {self.author.pk, self.other.pk})
+        follows.unfollow(self.reader.pk, self.author.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(follow_graph.following(self.reader.pk),
+                             {self.other.pk})
+
+    def test_graph_loaded_before_commit_gets_change(self):
+        with transaction.atomic():
+            follows.follow(self.reader.pk, self.author.pk)
+            cache.set(follow_graph.FOLLOWING_KEY.format(self.reader.pk),
+                      frozenset(), None)
+        self.assertEqual(follow_graph.following(self.reader.pk),
+                         {self.author.pk})
+
+    def test_feed_cards_show_follow_state(self):
+        for author in (self.reader, self.author, self.other):
+            Post.objects.create(text=f'Пост {author.username}',
+                                author=author)
+        follows.follow(self.reader.pk, self.author.pk)
+        client = Client()
+        client.force_login(self.reader)
+        url = reverse('posts:index')
+        content = client.get(url).content.decode()
+        self.assertIn(reverse('posts:profile_unfollow',
+                              kwargs={'username': 'Writer'}), content)
+        self.assertIn(reverse('posts:profile_follow',
+                              kwargs={'username': 'Other'}), content)
+        self.assertNotIn(reverse('posts:profile_follow',
+                                 kwargs={'username': 'Reader'}), content)
+        follows.follow(self.reader.pk, self.other.pk)
+        content = client.get(url).content.decode()
+        self.assertIn(reverse('posts:profile_unfollow',
+                              kwargs={'username': 'Other'}), content)
+        anonymous = Client().get(url).content.decode()
+        self.assertNotIn('Подписаться', anonymous)
@@ -0,0 +1,109 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from .. import follow_graph, follows
+from ..models import Follow, Post, TimelineEntry, UserStats
+
+
+User = get_user_model()
+
+
+class FollowTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.other = User.objects.create_user(username='Other')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_follow_is_idempotent(self):
+        self.assertTrue(follows.follow(self.reader.pk, self.author.pk))
+        with self.assertNumQueries(1):
+            self.assertFalse(follows.follow(self.reader.pk, self.author.pk))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.post).exists())
+
+    def test_cannot_follow_self(self):
+        self.assertFalse(follows.follow(self.reader.pk, self.reader.pk))
+        self.assertFalse(Follow.objects.exists())
+
+    def test_unfollow_missing_is_not_error(self):
+        response = self.reader_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'Writer'})
+        )
+        self.assertRedirects(response, reverse('posts:profile',
+                                               kwargs={'username': 'Writer'}))
+        with self.assertNumQueries(1):
+            self.assertFalse(follows.unfollow(self.reader.pk,
+                                              self.author.pk))
+
+    def test_unfollow_reverts_side_effects(self):
+        follows.follow(self.reader.pk, self.author.pk)
+        self.assertTrue(follows.unfollow(self.reader.pk, self.author.pk))
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+
+    def test_bulk_follow_and_unfollow(self):
+        follows.follow(self.reader.pk, self.author.pk)
+        pairs = [(self.reader.pk, self.author.pk),
+                 (self.reader.pk, self.other.pk),
+                 (self.reader.pk, self.other.pk),
+                 (self.other.pk, self.author.pk),
+                 (self.other.pk, self.other.pk)]
+        self.assertEqual(follows.follow_many(pairs), 2)
+        self.assertEqual(Follow.objects.count(), 3)
+        self.assertEqual(self.stats(self.author).followers_count, 2)
+        self.assertEqual(self.stats(self.reader).following_count, 2)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.other, post=self.post).exists())
+        self.assertEqual(follows.unfollow_many(pairs), 3)
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+
+class FollowAtomicityTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='Reader')
+        self.author = User.objects.create_user(username='Writer')
+
+    def fail_side_effects(self):
+        return mock.patch.object(follow_graph, 'changed',
+                                 side_effect=DatabaseError)
+
+    def test_failed_side_effect_rolls_back_follow(self):
+        with self.fail_side_effects(), self.assertRaises(DatabaseError):
+            follows.follow(self.reader.pk, self.author.pk)
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(UserStats.objects.filter(
+            user=self.author, followers_count__gt=0
+        ).exists())
+
+    def test_failed_side_effect_rolls_back_unfollow(self):
+        follows.follow(self.reader.pk, self.author.pk)
+        with self.fail_side_effects(), self.assertRaises(DatabaseError):
+            follows.unfollow(self.reader.pk, self.author.pk)
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1
+        )
@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..fragments import fragment_stats
+from ..models import Post
+
+
+User = get_user_model()
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Rin')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+        cls.DETAIL_REVERSE = reverse('posts:post_detail',
+                                     args=(cls.post.pk,))
+
+    def setUp(self):
+        cache.clear()
+        self.rin_client = Client()
+        self.rin_client.force_login(self.user)
+
+    def test_card_is_rendered_once(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:profile', args=(self.user.username,)))
+        self.assertEqual(fragment_stats()['card'], {'hit': 1, 'miss': 1})
+
+    def test_edit_invalidates_card(self):
+        self.client.get(reverse('posts:index'))
+        self.rin_client.post(reverse('posts:post_edit', args=(self.post.pk,)),
+                             data={'text': 'Исправленный пост'})
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Исправленный пост')
+        self.assertEqual(fragment_stats()['card']['miss'], 2)
+
+    def test_new_comment_invalidates_comment_list(self):
+        self.client.get(self.DETAIL_REVERSE)
+        self.rin_client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            data={'text': 'Новый комментарий'}
+        )
+        response = self.client.get(self.DETAIL_REVERSE)
+        self.assertContains(response, 'Новый комментарий')
+        self.client.get(self.DETAIL_REVERSE)
+        self.assertEqual(fragment_stats()['comments'],
+                         {'hit': 1, 'miss': 2})
@@ -0,0 +1,44 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase
+
+from ..counters import recount_all
+from ..management.commands.index_advisor import problems
+from ..models import Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class IndexAdvisorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Writer')
+        group = Group.objects.create(title='Группа', slug='advisor',
+                                     description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Post.objects.create(text='Пост про котов', author=cls.author,
+                            group=group)
+        recount_all()
+
+    def test_feeds_use_indexes(self):
+        out = StringIO()
+        call_command('index_advisor', '--strict', stdout=out)
+        self.assertIn('Найдено проблем: 0', out.getvalue())
+
+    def test_problems_in_plan(self):
+        plan = ['SCAN posts_post', 'USE TEMP B-TREE FOR ORDER BY',
+                'SEARCH auth_user USING INTEGER PRIMARY KEY (rowid=?)',
+                'SCAN posts_post USING INDEX post_date_idx']
+        self.assertEqual([kind for kind, _ in problems(plan)],
+                         ['полный просмотр',
+                          'сортировка во временном B-дереве'])
+
+    def test_follow_is_unique(self):
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=self.reader, author=self.author)
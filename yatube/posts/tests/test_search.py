@@ -0,0 +1,81 @@
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Post
+
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.SEARCH_REVERSE = reverse('posts:search')
+        cls.user = User.objects.create_user(username='Rin')
+        cls.post = Post.objects.create(text='Пост про котов', author=cls.user)
+        cls.other = Post.objects.create(text='Пост про собак',
+                                        author=cls.user)
+        cls.comment = Comment.objects.create(
+            post=cls.other, author=cls.user, text='А я люблю котов'
+        )
+
+    def search(self, query, **params):
+        return self.client.get(self.SEARCH_REVERSE, {'q': query, **params})
+
+    def test_search_finds_posts_and_comments(self):
+        response = self.search('котов')
+        found = [post for hit, post in response.context['results']]
+        self.assertCountEqual(found, [self.post, self.other])
+        self.assertContains(response, '<mark>котов</mark>')
+
+    def test_snippet_is_escaped(self):
+        Post.objects.create(text='<script>котов</script>', author=self.user)
+        response = self.search('котов')
+        self.assertNotContains(response, '<script>')
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Пост про мышей'
+        post.save()
+        Comment.objects.get(pk=self.comment.pk).delete()
+        self.assertEqual(search.search('котов', 10), [])
+        self.assertEqual(search.search('мышей', 10)[0].post_id, post.pk)
+
+    def test_search_cursor_pages(self):
+        Post.objects.bulk_create([
+            Post(text=f'Пост про енотов {i}', author=self.user)
+            for i in range(settings.POSTS_PER_PAGE + 2)
+        ])
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.search('енотов')
+        first = response.context['results']
+        self.assertEqual(len(first), settings.POSTS_PER_PAGE)
+        response = self.search('енотов',
+                               after=response.context['next_cursor'])
+        second = response.context['results']
+        self.assertEqual(len(second), 2)
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertFalse({post for _, post in first}
+                         & {post for _, post in second})
+
+    def test_quotes_do_not_break_search(self):
+        response = self.search('"котов OR')
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_uses_index(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        admin_client = Client()
+        admin_client.force_login(admin)
+        response = admin_client.get('/admin/posts/comment/', {'q': 'котов'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.comment])
+        response = admin_client.get('/admin/posts/post/', {'q': 'собак'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.other])
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+
+
+def seed_load(prefix, seed=1, *options):
+    out = StringIO()
+    call_command(
+        'seed_load', '--users=30', '--groups=5', '--posts=200',
+        '--comments=300', '--follows=60', '--batch-size=50',
+        f'--seed={seed}', f'--prefix={prefix}', *options, stdout=out
+    )
+    return out.getvalue()
+
+
+class SeedLoadTests(TestCase):
+    def test_creates_consistent_data(self):
+        seed_load('load')
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 5)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertLessEqual(Follow.objects.count(), 60)
+        self.assertFalse(Follow.objects.filter(
+            user=F('author')).exists())
+        post = Post.objects.order_by('-comments_count').first()
+        self.assertEqual(post.comments_count, post.comments.count())
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_reports_inserted_rows(self):
+        out = seed_load('load')
+        self.assertIn(f'{Follow._meta.verbose_name_plural}: '
+                      f'{Follow.objects.count()} из 60', out)
+        out = seed_load('load')
+        self.assertIn(f'{User._meta.verbose_name_plural}: 0 из 30', out)
+
+    def test_same_seed_same_data(self):
+        seed_load('first')
+        seed_load('second')
+        texts = list(Post.objects.order_by('pk').values_list('text',
+                                                             flat=True))
+        self.assertEqual(texts[:200], texts[200:])
+
+    def test_image_posts_are_ready(self):
+        media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root):
+            seed_load('images', 1, '--images=0.5', '--image-pool=2')
+        images = Post.objects.exclude(image='')
+        self.assertTrue(images.exists())
+        self.assertFalse(images.filter(thumbnail_ready=False).exists())
+        self.assertTrue(os.listdir(os.path.join(media_root, 'cache')))
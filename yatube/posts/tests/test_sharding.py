@@ -0,0 +1,170 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import counters, sharding
+from ..models import (Comment, Follow, Group, Post, TimelineEntry,
+                      UserStats)
+
+
+User = get_user_model()
+SHARDS = ['default', 'posts_1', 'posts_2']
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardingTests(TestCase):
+    databases = set(SHARDS)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [User.objects.create_user(username=f'Author{number}')
+                       for number in range(len(SHARDS))]
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='sharded')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def create_posts(self, count):
+        """Посты авторов по очереди с убывающими датами."""
+        now = timezone.now()
+        posts = []
+        for number in range(count):
+            author = self.authors[number % len(self.authors)]
+            post = Post.objects.create(author=author, group=self.group,
+                                       text=f'Пост {number}')
+            Post.objects.using(post._state.db).filter(pk=post.pk).update(
+                pub_date=now - timedelta(minutes=number)
+            )
+            posts.append(post)
+        return posts
+
+    def test_posts_live_on_author_shard(self):
+        posts = self.create_posts(6)
+        self.assertEqual(len({post.pk for post in posts}), 6)
+        self.assertEqual(
+            {sharding.shard_for(author.pk) for author in self.authors},
+            set(SHARDS)
+        )
+        for post in posts:
+            alias = sharding.shard_for(post.author_id)
+            self.assertEqual(post._state.db, alias)
+            for other in SHARDS:
+                self.assertEqual(
+                    Post.objects.using(other).filter(pk=post.pk).exists(),
+                    other == alias
+                )
+
+    def test_comments_live_on_post_shard(self):
+        post = self.create_posts(2)[1]
+        self.client.post(reverse('posts:add_comment', args=[post.pk]),
+                         {'text': 'Комментарий'})
+        comment = Comment.objects.using(post._state.db).get(post=post)
+        self.assertEqual(comment.author, self.reader)
+        self.assertEqual(
+            Post.objects.using(post._state.db).get(pk=post.pk)
+            .comments_count, 1
+        )
+
+    def test_feeds_merge_shards_by_date(self):
+        posts = self.create_posts(12)
+        for url in (reverse('posts:index'),
+                    reverse('posts:group_posts', args=[self.group.slug])):
+            with self.subTest(url=url):
+                page = self.client.get(url).context['page_obj']
+                self.assertEqual([post.pk for post in page],
+                                 [post.pk for post in posts[:10]])
+                self.assertEqual(page[0].author, posts[0].author)
+                older = self.client.get(
+                    f'{url}?after={page.paginator.next_cursor}'
+                ).context['page_obj']
+                self.assertEqual([post.pk for post in older],
+                                 [post.pk for post in posts[10:]])
+
+    def test_profile_and_post_detail_read_one_shard(self):
+        post = self.create_posts(3)[1]
+        alias = post._state.db
+        urls = (reverse('posts:profile', args=[post.author.username]),
+                reverse('posts:post_detail', args=[post.pk]))
+        for url in urls:
+            with self.subTest(url=url):
+                captured = {other: CaptureQueriesContext(connections[other])
+                            for other in SHARDS if other != 'default'}
+                for context in captured.values():
+                    context.__enter__()
+                try:
+                    response = self.client.get(url)
+                finally:
+                    for context in captured.values():
+                        context.__exit__(None, None, None)
+                self.assertEqual(response.status_code, 200)
+                for other, context in captured.items():
+                    self.assertEqual(bool(context.captured_queries),
+                                     other == alias)
+
+    def test_delete_removes_timeline_entries(self):
+        Follow.objects.create(user=self.reader, author=self.authors[1])
+        post = Post.objects.create(author=self.authors[1], text='Пост')
+        self.assertTrue(TimelineEntry.objects.filter(post_id=post.pk)
+                        .exists())
+        post.delete()
+        self.assertFalse(TimelineEntry.objects.filter(post_id=post.pk)
+                         .exists())
+        self.assertFalse(Post.objects.using(sharding.shard_for(
+            self.authors[1].pk
+        )).exists())
+
+    def test_reshard_moves_posts_with_comments(self):
+        posts = self.create_posts(6)
+        for post in posts:
+            Comment.objects.create(post=post, author=self.reader,
+                                   text='Комментарий')
+        with override_settings(POST_SHARDS=['default', 'posts_1']):
+            moved = sum(post._state.db != sharding.shard_for(post.author_id)
+                        for post in posts)
+            self.assertTrue(moved)
+            out = StringIO()
+            call_command('reshard_posts', batch_size=1, stdout=out)
+            self.assertIn(f'Перенесено постов: {moved}, '
+                          f'комментариев: {moved}', out.getvalue())
+            for post in posts:
+                alias = sharding.shard_for(post.author_id)
+                self.assertTrue(Post.objects.using(alias)
+                                .filter(pk=post.pk).exists())
+                self.assertTrue(Comment.objects.using(alias)
+                                .filter(post_id=post.pk).exists())
+            self.assertFalse(Post.objects.using('posts_2').exists())
+            response = self.client.get(
+                reverse('posts:post_detail', args=[posts[2].pk])
+            )
+            self.assertEqual(len(response.context['comments']), 1)
+
+    def test_recount_counts_every_shard(self):
+        posts = self.create_posts(6)
+        for post in posts:
+            Comment.objects.create(post=post, author=self.reader,
+                                   text='Комментарий')
+        self.assertEqual(counters.recount_all(), 0)
+        Group.objects.update(posts_count=0)
+        UserStats.objects.update(posts_count=0)
+        for alias in SHARDS:
+            Post.objects.using(alias).update(comments_count=0)
+        self.assertEqual(counters.recount_all(), 1 + len(self.authors) + 6)
+        self.assertEqual(Group.objects.get().posts_count, 6)
+        for author in self.authors:
+            self.assertEqual(
+                UserStats.objects.get(user=author).posts_count, 2
+            )
+        for post in posts:
+            self.assertEqual(Post.objects.using(post._state.db)
+                             .get(pk=post.pk).comments_count, 1)
@@ -0,0 +1,122 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from sorl.thumbnail import get_thumbnail
+
+from .. import thumbnails
+from ..models import Post
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+PLACEHOLDER = 'Изображение обрабатывается'
+
+
+def uploaded(name='small.gif'):
+    return SimpleUploadedFile(name=name, content=SMALL_GIF,
+                              content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Rin')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(text='Пост с картинкой',
+                                        author=self.user, image=uploaded())
+        self.DETAIL_REVERSE = reverse('posts:post_detail',
+                                      kwargs={'post_id': self.post.pk})
+
+    def test_placeholder_until_generated(self):
+        """Пока миниатюры не готовы, вместо картинки показана заглушка."""
+        self.assertContains(self.client.get(self.DETAIL_REVERSE), PLACEHOLDER)
+        self.assertTrue(thumbnails.generate(self.post.pk))
+        response = self.client.get(self.DETAIL_REVERSE)
+        self.assertNotContains(response, PLACEHOLDER)
+        self.assertContains(response, '<img class="card-img my-2"')
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            '<img class="card-img my-2"')
+
+    def test_generate_is_scheduled_after_commit(self):
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            post = Post.objects.create(text='Ещё пост', author=self.user,
+                                       image=uploaded('other.gif'))
+            post.text = 'Новый текст'
+            post.save()
+        schedule.assert_called_once_with(post.pk)
+
+    def test_new_image_resets_ready(self):
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            self.post.image = uploaded('new.gif')
+            self.post.save()
+        schedule.assert_called_once_with(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.thumbnail_ready)
+
+    def test_post_without_image(self):
+        post = Post.objects.create(text='Без картинки', author=self.user)
+        self.assertFalse(thumbnails.generate(post.pk))
+
+    def test_generate_thumbnails_command(self):
+        out = StringIO()
+        call_command('generate_thumbnails', '--missing', '--workers=1',
+                     stdout=out)
+        self.assertIn('Обработано постов: 1', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnail_ready)
+
+    def test_prefetch_matches_get_thumbnail(self):
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        geometry, options = settings.POST_THUMBNAILS['card']
+        expected = get_thumbnail(self.post.image, geometry, **options)
+        thumbnails.prefetch([self.post], 'card')
+        self.assertEqual(self.post.thumbnails['card'].name, expected.name)
+
+    def test_page_thumbnails_in_one_query(self):
+        """Миниатюры страницы находятся одним запросом к KV-хранилищу."""
+        for number in range(3):
+            post = Post.objects.create(text=f'Пост {number}', author=self.user,
+                                       image=uploaded(f'{number}.gif'))
+            thumbnails.generate(post.pk)
+        thumbnails.generate(self.post.pk)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        kv_queries = [query for query in queries.captured_queries
+                      if 'thumbnail_kvstore' in query['sql']]
+        self.assertEqual(len(kv_queries), 1)
+        self.assertEqual(
+            response.content.decode().count('<img class="card-img'), 4
+        )
@@ -0,0 +1,188 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import feeds, follows
+from ..models import Follow, Post, TimelineEntry
+
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.FOLLOW_INDEX_REVERSE = reverse('posts:follow_index')
+        cls.user = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.post = Post.objects.create(text='Старый пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.user)
+
+    def test_follow_backfills_timeline(self):
+        self.reader_client.get(reverse('posts:profile_follow',
+                                       kwargs={'username': 'Writer'}))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=self.post).exists())
+
+    def test_new_post_is_pushed_to_followers(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        response = self.reader_client.get(self.FOLLOW_INDEX_REVERSE)
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_unfollow_retracts_timeline(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        self.reader_client.get(reverse('posts:profile_unfollow',
+                                       kwargs={'username': 'Writer'}))
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+    @override_settings(TIMELINE_MAX_LENGTH=3)
+    def test_timeline_is_capped(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(5)]
+        entries = TimelineEntry.objects.filter(user=self.user)
+        self.assertEqual(
+            [entry.post for entry in entries], posts[::-1][:3]
+        )
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_push_trims_timelines_in_one_statement(self):
+        fans = [User.objects.create_user(username=f'Fan{number}')
+                for number in range(20)]
+        follows.follow_many([(fan.pk, self.author.pk) for fan in fans])
+        for number in range(2):
+            Post.objects.create(text=f'Пост {number}', author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            Post.objects.create(text='Новый пост', author=self.author)
+        statements = [query['sql'] for query in queries.captured_queries]
+        trim = f'DELETE FROM {TimelineEntry._meta.db_table}'
+        self.assertEqual(
+            len([sql for sql in statements if sql.startswith(trim)]), 1
+        )
+        self.assertFalse([sql for sql in statements
+                          if sql.startswith('SELECT')
+                          and Follow._meta.db_table in sql])
+        for fan in fans:
+            self.assertEqual(
+                TimelineEntry.objects.filter(user=fan).count(), 2
+            )
+
+    def test_follow_index_reads_timeline_slice(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        heavy = feeds.heavy_authors()
+        with self.assertNumQueries(5):
+            response = self.reader_client.get(self.FOLLOW_INDEX_REVERSE)
+        self.assertFalse(heavy)
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_follow_version_does_not_grow_with_follows(self):
+        follows.follow_many([
+            (self.user.pk,
+             User.objects.create_user(username=f'Author{number}').pk)
+            for number in range(5)
+        ])
+        response = self.reader_client.get(self.FOLLOW_INDEX_REVERSE)
+        self.assertEqual(len(response.context['cache_version'].split('.')),
+                         2)
+
+    def test_cached_follow_index_skips_timeline(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        self.reader_client.get(self.FOLLOW_INDEX_REVERSE)
+        with self.assertNumQueries(2):
+            self.reader_client.get(self.FOLLOW_INDEX_REVERSE)
+
+    def test_rebuild_timelines_command(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=self.post).exists())
+
+
+@override_settings(FEED_HEAVY_AUTHOR_FOLLOWERS=2)
+class HybridFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.FOLLOW_INDEX_REVERSE = reverse('posts:follow_index')
+        cls.user = User.objects.create_user(username='Reader')
+        cls.fan = User.objects.create_user(username='Fan')
+        cls.star = User.objects.create_user(username='Star')
+        cls.author = User.objects.create_user(username='Writer')
+
+    def setUp(self):
+        cache.clear()
+        Follow.objects.create(user=self.user, author=self.star)
+        Follow.objects.create(user=self.fan, author=self.star)
+        Follow.objects.create(user=self.user, author=self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.user)
+
+    def test_heavy_author_posts_are_pulled(self):
+        star_post = Post.objects.create(text='Пост звезды', author=self.star)
+        post = Post.objects.create(text='Пост автора', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=star_post).exists())
+        response = self.reader_client.get(self.FOLLOW_INDEX_REVERSE)
+        self.assertEqual(list(response.context['page_obj']),
+                         [post, star_post])
+        self.assertEqual(response.context['page_obj'].paginator.path,
+                         'hybrid')
+        self.assertEqual(feeds.feed_stats()['hybrid'], 1)
+
+    def test_merged_feed_cursor_pages(self):
+        posts = []
+        for i in range(12):
+            author = self.star if i % 2 else self.author
+            posts.append(Post.objects.create(text=f'Пост {i}', author=author))
+        response = self.reader_client.get(self.FOLLOW_INDEX_REVERSE)
+        paginator = response.context['page_obj'].paginator
+        self.assertEqual(list(response.context['page_obj']),
+                         posts[::-1][:10])
+        response = self.reader_client.get(
+            f'{self.FOLLOW_INDEX_REVERSE}?after={paginator.next_cursor}'
+        )
+        self.assertEqual(list(response.context['page_obj']),
+                         posts[::-1][10:])
+        self.assertFalse(response.context['page_obj'].paginator.has_next)
+
+    def test_new_posts_reset_cached_author_lists(self):
+        feeds.latest_posts(self.star.pk)
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.star)
+                 for i in range(2)]
+        self.assertIsNone(
+            cache.get(feeds.LATEST_POSTS_KEY.format(self.star.pk))
+        )
+        self.assertEqual(
+            [item.post_id for item in feeds.latest_posts(self.star.pk)],
+            [post.pk for post in posts[::-1]]
+        )
+
+    def test_new_heavy_author_resets_heavy_set(self):
+        self.assertNotIn(self.author.pk, feeds.heavy_authors())
+        Follow.objects.create(user=self.fan, author=self.author)
+        Post.objects.create(text='Пост', author=self.author)
+        self.assertIsNone(cache.get(feeds.HEAVY_AUTHORS_KEY))
+        self.assertIn(self.author.pk, feeds.heavy_authors())
+
+    def test_author_below_threshold_is_fanned_out(self):
+        star_post = Post.objects.create(text='Пост звезды', author=self.star)
+        self.assertIn(self.star.pk, feeds.heavy_authors())
+        follows.unfollow(self.fan.pk, self.star.pk)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=star_post
+        ).exists())
+        self.assertNotIn(self.star.pk, feeds.heavy_authors())
+        response = self.reader_client.get(self.FOLLOW_INDEX_REVERSE)
+        self.assertIn(star_post, response.context['page_obj'])
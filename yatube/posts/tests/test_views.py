@@ -5,9 +5,12 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from ..counters import recount_all
 from ..forms import PostForm
 from ..models import Group, Post, Follow
 
@@ -217,8 +220,10 @@ class PostPaginatorTests(TestCase):
             post_list.append(Post(text='Тестовый пост',
                                   author=cls.user, group=cls.group))
         cls.posts = Post.objects.bulk_create(post_list)
+        recount_all()
 
     def setUp(self):
+        cache.clear()
         self.platon_client = Client()
         self.platon_client.force_login(self.user)
 
@@ -242,6 +247,72 @@ class PostPaginatorTests(TestCase):
                                  Post.objects.count() %
                                  settings.POSTS_PER_PAGE)
 
+    def test_cursor_paginator_pages(self):
+        response = get_request(self.platon_client, self.INDEX_REVERSE)
+        paginator = response.context['page_obj'].paginator
+        self.assertTrue(paginator.is_cursor)
+        self.assertTrue(paginator.has_next)
+        self.assertFalse(paginator.has_previous)
+        first_page = list(response.context['page_obj'])
+        response = get_request(
+            self.platon_client,
+            f'{self.INDEX_REVERSE}?after={paginator.next_cursor}'
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 13 - settings.POSTS_PER_PAGE)
+        self.assertFalse(page_obj.paginator.has_next)
+        self.assertTrue(page_obj.paginator.has_previous)
+        self.assertFalse(set(first_page) & set(page_obj))
+        response = get_request(
+            self.platon_client,
+            f'{self.INDEX_REVERSE}?before={page_obj.paginator.previous_cursor}'
+        )
+        self.assertEqual(list(response.context['page_obj']), first_page)
+
+    def test_cursor_paginator_without_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.INDEX_REVERSE)
+        self.assertFalse(any('COUNT(' in query['sql']
+                             for query in queries.captured_queries))
+        self.assertEqual(len(response.context['page_obj']),
+                         settings.POSTS_PER_PAGE)
+
+    def test_page_past_the_end_shows_last_page(self):
+        response = get_request(
+            self.platon_client,
+            f'{self.INDEX_REVERSE}?page={settings.POSTS_MAX_PAGE + 100}'
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 2)
+        self.assertEqual(len(page_obj), 13 - settings.POSTS_PER_PAGE)
+        self.assertFalse(page_obj.has_next())
+
+    @override_settings(POSTS_MAX_PAGE=1)
+    def test_deep_page_is_capped(self):
+        for page in (2, 300):
+            with self.subTest(page=page):
+                response = get_request(self.platon_client,
+                                       f'{self.INDEX_REVERSE}?page={page}')
+                page_obj = response.context['page_obj']
+                self.assertEqual(page_obj.number, 1)
+                self.assertEqual(list(page_obj.paginator.page_range), [1])
+                self.assertNotContains(response, '?page=2')
+
+    @override_settings(POSTS_MAX_PAGE=1)
+    def test_deep_page_counts_only_capped_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            get_request(self.platon_client, f'{self.INDEX_REVERSE}?page=2')
+        counts = [query['sql'] for query in queries.captured_queries
+                  if 'COUNT(' in query['sql']]
+        self.assertEqual(len(counts), 1)
+        self.assertIn(f'LIMIT {settings.POSTS_PER_PAGE}', counts[0])
+
+    def test_broken_cursor_returns_first_page(self):
+        response = get_request(self.platon_client,
+                               f'{self.INDEX_REVERSE}?after=broken')
+        self.assertEqual(len(response.context['page_obj']),
+                         settings.POSTS_PER_PAGE)
+
 
 class TestCache(TestCase):
     @classmethod
@@ -262,6 +333,7 @@ class TestCache(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.piton_client = Client()
         self.piton_client.force_login(self.user)
 
@@ -279,11 +351,46 @@ class TestCache(TestCase):
         self.assertEqual(post.group.slug, self.group.slug)
         self.assertEqual(post.group.description, self.group.description)
         self.assertEqual(post.author, self.post.author)
-        post.delete()
+        Post.objects.filter(pk=post.pk).update(text='Без сигналов')
         content_after = get_request(self.piton_client,
                                     self.INDEX_REVERSE).content
         self.assertEqual(content_before, content_after)
-        cache.clear()
+        post.delete()
         content_after = get_request(self.piton_client,
                                     self.INDEX_REVERSE).content
         self.assertNotEqual(content_before, content_after)
+
+    def test_follow_cache_is_per_user(self):
+        reader = User.objects.create_user(username='Reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        Follow.objects.create(user=reader, author=self.user)
+        follow_url = reverse('posts:follow_index')
+        reader_content = get_request(reader_client, follow_url).content
+        piton_content = get_request(self.piton_client, follow_url).content
+        self.assertIn(self.post.text.encode(), reader_content)
+        self.assertNotIn(self.post.text.encode(), piton_content)
+
+    def test_new_post_invalidates_follow_cache(self):
+        reader = User.objects.create_user(username='Reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        Follow.objects.create(user=reader, author=self.user)
+        follow_url = reverse('posts:follow_index')
+        get_request(reader_client, follow_url)
+        Post.objects.create(text='Свежий пост', author=self.user)
+        content = get_request(reader_client, follow_url).content
+        self.assertIn('Свежий пост'.encode(), content)
+
+    def test_edited_post_invalidates_follow_cache(self):
+        reader = User.objects.create_user(username='Reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        Follow.objects.create(user=reader, author=self.user)
+        follow_url = reverse('posts:follow_index')
+        get_request(reader_client, follow_url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        content = get_request(reader_client, follow_url).content
+        self.assertIn('Исправленный пост'.encode(), content)
@@ -0,0 +1,139 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import feeds, generations, sharding
+
+
+logger = logging.getLogger(__name__)
+executor = None
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails'
+        )
+    return executor
+
+
+def render(image):
+    """Создаёт миниатюры картинки во всех размерах POST_THUMBNAILS."""
+    for geometry, options in settings.POST_THUMBNAILS.values():
+        get_thumbnail(image, geometry, **options)
+
+
+def generate(post_id):
+    """Создаёт все миниатюры картинки поста и отмечает пост готовым.
+
+    Возвращает True, если миниатюры созданы.
+    """
+    post = sharding.post_rows(post_id).only(
+        'image', 'author_id', 'group_id'
+    ).first()
+    if post is None or not post.image:
+        return False
+    try:
+        render(post.image)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры поста %s', post_id)
+        return False
+    marked = sharding.post_rows(post_id).filter(
+        image=post.image.name
+    ).update(
+        thumbnail_ready=True, updated=timezone.now()
+    )
+    if marked:
+        generations.bump_post(post)
+        feeds.bump_feeds(post.author_id)
+    return bool(marked)
+
+
+def run(post_id):
+    """generate() для фонового потока: закрывает соединения потока."""
+    try:
+        return generate(post_id)
+    finally:
+        connections.close_all()
+
+
+def reset(post_id):
+    sharding.post_rows(post_id).update(thumbnail_ready=False)
+
+
+def schedule(post_id):
+    """Ставит создание миниатюр в пул потоков после коммита транзакции."""
+    transaction.on_commit(lambda: get_executor().submit(run, post_id))
+
+
+def thumbnail_file(image, geometry, options):
+    """Файл миниатюры, который вернул бы get_thumbnail, без обращения к KV.
+
+    Дополняет опции так же, как ThumbnailBackend.get_thumbnail.
+    """
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return ImageFile(
+        backend._get_thumbnail_filename(source, geometry, options),
+        default.storage
+    )
+
+
+def stored_images(keys):
+    """Записи KV-хранилища sorl по ключам: один get_many и один SELECT."""
+    kvstore = default.kvstore
+    if not keys or not isinstance(kvstore, CachedDBStore):
+        return {}
+    raw_keys = {add_prefix(key): key for key in keys}
+    found = kvstore.cache.get_many(raw_keys)
+    missing = [raw_key for raw_key in raw_keys if raw_key not in found]
+    if missing:
+        stored = dict(KVStoreModel.objects.filter(key__in=missing)
+                      .values_list('key', 'value'))
+        kvstore.cache.set_many(stored, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        found.update(stored)
+    return {raw_keys[raw_key]: deserialize_image_file(value)
+            for raw_key, value in found.items()
+            if value and value != EMPTY_VALUE}
+
+
+def prefetch(posts, *sizes):
+    """Заранее находит миниатюры постов страницы для размеров sizes.
+
+    Найденные файлы кладёт в post.thumbnails; чего нет в хранилище,
+    шаблон получит обычным тегом {% thumbnail %}.
+    """
+    wanted = {}
+    for post in posts:
+        post.thumbnails = {}
+        if not post.image or not post.thumbnail_ready:
+            continue
+        for size in sizes:
+            geometry, options = settings.POST_THUMBNAILS[size]
+            thumbnail = thumbnail_file(post.image, geometry, options)
+            wanted[thumbnail.key] = (post, size)
+    for key, image_file in stored_images(list(wanted)).items():
+        post, size = wanted[key]
+        post.thumbnails[size] = image_file
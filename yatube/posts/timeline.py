@@ -0,0 +1,219 @@
+from django.conf import settings
+from django.db import connection
+
+from . import feeds, generations, sharding
+from .models import Follow, Post, TimelineEntry, UserStats
+
+
+def trim(users, params, limit=None):
+    """Одним DELETE обрезает до limit записей ленты users.
+
+    users — SQL-условие на user_id, например «IN (%s, %s)».
+    """
+    table = TimelineEntry._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f' SELECT id FROM ('
+            f'  SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id'
+            f'  ORDER BY pub_date DESC, post_id DESC) AS position'
+            f'  FROM {table} WHERE user_id {users}'
+            f' ) ranked WHERE position > %s'
+            f')',
+            [*params, limit or settings.TIMELINE_MAX_LENGTH]
+        )
+
+
+def trim_timelines(user_ids, limit=None):
+    """Оставляет в лентах пользователей только limit свежих записей.
+
+    Один DELETE на пачку пользователей, а не на каждого.
+    """
+    user_ids = list(user_ids)
+    size = settings.TIMELINE_BATCH_SIZE
+    for start in range(0, len(user_ids), size):
+        batch = user_ids[start:start + size]
+        trim(f'IN ({", ".join(["%s"] * len(batch))})', batch, limit)
+
+
+def trim_timeline(user_id, limit=None):
+    """Оставляет в ленте пользователя только limit свежих записей."""
+    trim_timelines([user_id], limit)
+
+
+def fan_out(author_id, posts):
+    """Вставляет посты [(id, pub_date)] в ленты всех подписчиков автора.
+
+    Подписчики не загружаются: записи вставляет один INSERT ... SELECT
+    по подпискам, а ленты обрезает один DELETE. Поколения лент тех,
+    кому что-то вставилось, сдвигаются по RETURNING пачками.
+    """
+    if not posts:
+        return
+    ops = connection.ops
+    follows = (f'SELECT user_id FROM {Follow._meta.db_table} '
+               f'WHERE author_id = %s')
+    values = ', '.join(['(%s, %s)'] * len(posts))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{TimelineEntry._meta.db_table} (user_id, post_id, pub_date) '
+            f'SELECT follower.user_id, post.column1, post.column2 '
+            f'FROM ({follows}) follower, (VALUES {values}) post '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)} '
+            f'RETURNING user_id',
+            [author_id, *(value for pk, pub_date in posts
+                          for value in (
+                              pk, ops.adapt_datetimefield_value(pub_date)
+                          ))]
+        )
+        while True:
+            batch = cursor.fetchmany(settings.TIMELINE_BATCH_SIZE)
+            if not batch:
+                break
+            generations.bump(*{f'feed:{user_id}' for user_id, in batch})
+    trim(f'IN ({follows})', [author_id])
+
+
+def push_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Посты тяжёлых авторов не раскладываются: их лента подписчика
+    дочитывает сама из списка последних постов автора. Число
+    подписчиков берётся из счётчика.
+    """
+    feeds.forget_author(post.author_id)
+    followers = UserStats.objects.filter(user_id=post.author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    if not followers:
+        return
+    if feeds.is_heavy(followers):
+        feeds.mark_heavy(post.author_id)
+        return
+    fan_out(post.author_id, [(post.pk, post.pub_date)])
+
+
+def demote(author_ids):
+    """Раскладывает посты авторов, переставших быть тяжёлыми.
+
+    Пока автор тяжёлый, его посты в ленты не попадают. Когда после
+    отписок подписчиков становится меньше порога, последние посты
+    автора раскладываются по лентам, и множество тяжёлых сбрасывается.
+    """
+    heavy = feeds.heavy_authors().intersection(author_ids)
+    if not heavy:
+        return
+    light = list(UserStats.objects.filter(
+        user_id__in=heavy,
+        followers_count__lt=settings.FEED_HEAVY_AUTHOR_FOLLOWERS
+    ).values_list('user_id', flat=True))
+    for author_id in light:
+        fan_out(author_id, list(
+            sharding.posts_of(author_id)
+            .order_by('-pub_date', '-pk')
+            .values_list('pk', 'pub_date')[:settings.TIMELINE_MAX_LENGTH]
+        ))
+    if light:
+        feeds.forget_heavy_authors()
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты автора."""
+    if author_id in feeds.heavy_authors():
+        return
+    posts = (
+        sharding.posts_of(author_id)
+        .order_by('-pub_date', '-pk')
+        .values_list('pk', 'pub_date')[:settings.TIMELINE_MAX_LENGTH]
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    trim_timeline(user_id)
+
+
+def retract(user_id, *author_ids):
+    """Убирает из ленты подписчика посты авторов."""
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    if not sharding.is_sharded():
+        entries.filter(post__author_id__in=author_ids).delete()
+        return
+    post_ids = [
+        pk for author_id in author_ids
+        for pk in sharding.posts_of(author_id).values_list('pk', flat=True)
+    ]
+    entries.filter(post_id__in=post_ids).delete()
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    if sharding.is_sharded():
+        posts = followed_posts(user_id)
+    else:
+        posts = (
+            Post.objects.filter(author__following__user_id=user_id)
+            .order_by('-pub_date', '-pk')
+            .values_list('pk', 'pub_date')[:settings.TIMELINE_MAX_LENGTH]
+        )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts],
+        batch_size=settings.TIMELINE_BATCH_SIZE
+    )
+
+
+def followed_posts(user_id):
+    """Свежие (id, pub_date) подписок пользователя со всех шардов."""
+    limit = settings.TIMELINE_MAX_LENGTH
+    authors = Follow.objects.filter(user_id=user_id).values_list(
+        'author_id', flat=True
+    )
+    by_shard = {}
+    for author_id in authors:
+        by_shard.setdefault(sharding.shard_for(author_id), []).append(
+            author_id
+        )
+    rows = []
+    for alias, author_ids in by_shard.items():
+        rows += (
+            Post.objects.using(alias).filter(author_id__in=author_ids)
+            .order_by('-pub_date', '-pk')
+            .values_list('pk', 'pub_date')[:limit]
+        )
+    rows.sort(key=lambda row: (row[1], row[0]), reverse=True)
+    return rows[:limit]
+
+
+def rebuild_all():
+    """Собирает ленты всех подписчиков одним INSERT ... SELECT.
+
+    При шардировании посты и подписки в разных базах, и ленты
+    собираются по одной. Возвращает количество пересобранных лент.
+    """
+    TimelineEntry.objects.all().delete()
+    if sharding.is_sharded():
+        users = Follow.objects.values_list('user_id', flat=True).distinct()
+        for user_id in users.iterator():
+            rebuild(user_id)
+        return users.count()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, pub_date) '
+            f'SELECT user_id, post_id, pub_date FROM ('
+            f' SELECT follow.user_id, post.id AS post_id, post.pub_date,'
+            f' ROW_NUMBER() OVER (PARTITION BY follow.user_id'
+            f' ORDER BY post.pub_date DESC, post.id DESC) AS position'
+            f' FROM (SELECT DISTINCT user_id, author_id'
+            f' FROM {Follow._meta.db_table}) follow'
+            f' JOIN {Post._meta.db_table} post'
+            f' ON post.author_id = follow.author_id'
+            f') ranked WHERE position <= %s',
+            [settings.TIMELINE_MAX_LENGTH]
+        )
+    return Follow.objects.values('user_id').distinct().count()
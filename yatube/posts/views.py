@@ -1,61 +1,92 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 
+from . import feeds, follow_graph, follows, generations, search, sharding
+from .conditional import (conditional_feed, group_scopes, index_scopes,
+                          post_scopes, profile_scopes)
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
+from .models import Group, Post, User, UserStats
+from .pagination import get_page
 
 
-def paginator(request, posts, count=settings.POSTS_PER_PAGE):
-    paginator = Paginator(posts, count)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+def paginator(request, posts, count=settings.POSTS_PER_PAGE, **kwargs):
+    return get_page(request.GET, posts, count, settings.POSTS_MAX_PAGE,
+                    **kwargs)
 
 
+def feed_page(request, posts, related, **kwargs):
+    """Страница общей ленты; при шардировании — слияние всех шардов."""
+    if sharding.is_sharded():
+        return sharding.scatter_page(request.GET, posts, related,
+                                     settings.POSTS_PER_PAGE,
+                                     settings.POSTS_MAX_PAGE)
+    return paginator(request, posts.select_related(*related), **kwargs)
+
+
+def posts_count(user):
+    """Хранимый счётчик постов пользователя или None, если его ещё нет."""
+    try:
+        return user.stats.posts_count
+    except UserStats.DoesNotExist:
+        return None
+
+
+@conditional_feed(index_scopes)
 def index(request):
     template = 'posts/index.html'
-    posts = Post.objects.all()
     context = {
-        'page_obj': paginator(request, posts)
+        'page_obj': feed_page(request, Post.objects.all(),
+                              ('author', 'group')),
+        'cache_version': generations.index_version(request.user),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT
     }
     return render(request, template, context)
 
 
+@conditional_feed(group_scopes)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    posts = Post.objects.filter(group=group)
     context = {
         'group': group,
-        'page_obj': paginator(request, posts)
+        'page_obj': feed_page(request, posts, ('author', 'group'),
+                              total=group.posts_count),
+        'cache_version': generations.group_version(group.pk, request.user),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT
     }
     return render(request, template, context)
 
 
+@conditional_feed(profile_scopes)
 def profile(request, username):
     template = 'posts/profile.html'
-    profile = get_object_or_404(User, username=username)
-    profile_posts = profile.posts.all()
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(author=profile,
-                                          user=request.user).exists()
-    else:
-        following = False
+    profile = get_object_or_404(User.objects.select_related('stats'),
+                                username=username)
+    profile_posts = sharding.join(sharding.posts_of(profile.pk),
+                                  'author', 'group')
+    following = (request.user.is_authenticated
+                 and follow_graph.is_following(request.user.pk, profile.pk))
     context = {
-        'page_obj': paginator(request, profile_posts),
+        'page_obj': paginator(request, profile_posts,
+                              total=posts_count(profile)),
         'author': profile,
-        'following': following
+        'following': following,
+        'cache_version': generations.author_version(profile.pk),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT
     }
     return render(request, template, context)
 
 
+@conditional_feed(post_scopes)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        sharding.join(sharding.post_rows(post_id), 'author__stats', 'group')
+    )
     comment_form = CommentForm()
-    comments = post.comments.all()
+    comments = sharding.join(post.comments.all(), 'author')
     context = {
         'post': post,
         'form': comment_form,
@@ -64,6 +95,25 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+def post_search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    after = search.decode_cursor(request.GET.get('after', ''))
+    hits = search.search(query, settings.POSTS_PER_PAGE + 1, after)
+    has_next = len(hits) > settings.POSTS_PER_PAGE
+    hits = hits[:settings.POSTS_PER_PAGE]
+    posts = sharding.in_bulk({hit.post_id for hit in hits}, 'author',
+                             'group')
+    context = {
+        'query': query,
+        'results': [(hit, posts[hit.post_id]) for hit in hits
+                    if hit.post_id in posts],
+        'next_cursor': search.encode_cursor(hits[-1]) if has_next else None,
+        'is_paged': after is not None
+    }
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None)
@@ -81,7 +131,7 @@ def post_create(request):
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(sharding.post_rows(post_id))
     if post.author != request.user:
         return redirect('posts:post_detail', post_id)
     template = 'posts/create_post.html'
@@ -99,7 +149,7 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(sharding.post_rows(post_id))
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -111,10 +161,13 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    authors = Follow.objects.filter(user=request.user)
-    posts = Post.objects.filter(author__following__in=authors)
+    page_obj = feeds.follow_feed(request.user, request.GET)
     context = {
-        'page_obj': paginator(request, posts)
+        'page_obj': page_obj,
+        'cache_version': generations.follow_version(
+            request.user.pk, page_obj.paginator.pull_authors
+        ),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT
     }
     return render(request, 'posts/follow.html', context)
 
@@ -122,14 +175,12 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+    follows.follow(request.user.pk, author.pk)
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    follow = Follow.objects.get(user=request.user, author=author)
-    follow.delete()
+    follows.unfollow(request.user.pk, author.pk)
     return redirect('posts:profile', username=username)
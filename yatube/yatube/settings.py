@@ -10,7 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
+import json
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -50,6 +55,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryInspectorMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,10 +93,32 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'serialize_writes': False,
+        },
+    },
+    'replica': {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
+    **{
+        alias: {
+            'ENGINE': 'core.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, f'db.{alias}.sqlite3'),
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'pragmas': {'foreign_keys': 'OFF'},
+            },
+        }
+        for alias in ('posts_1', 'posts_2')
+    },
 }
+DATABASE_ROUTERS = ['posts.sharding.ShardRouter',
+                    'core.routers.ReplicaRouter']
 
 
 # Password validation
@@ -137,11 +166,57 @@ LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 POSTS_PER_PAGE = 10
+POSTS_MAX_PAGE = 50
+TIMELINE_MAX_LENGTH = 500
+TIMELINE_BATCH_SIZE = 500
+FEED_HEAVY_AUTHOR_FOLLOWERS = 1000
+FEED_HEAVY_AUTHORS_TIMEOUT = 600
+FEED_AUTHOR_LATEST_LENGTH = 500
+FEED_AUTHOR_LATEST_TIMEOUT = 600
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center'}),
+    'detail': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+THUMBNAIL_WORKERS = 2
+DELETION_BATCH_SIZE = 500
+DELETION_PAUSE = 0
+DELETION_IN_BACKGROUND = True
+ADMIN_EXACT_COUNT_LIMIT = 10000
+QUERY_REPEAT_LIMIT = 3
+QUERY_BUDGET_STRICT = False
+QUERY_BUDGETS_PATH = os.path.join(BASE_DIR, 'yatube', 'budgets.json')
+with open(QUERY_BUDGETS_PATH, encoding='utf-8') as baseline:
+    budgets = json.load(baseline)
+QUERY_BUDGETS = budgets['queries']
+QUERY_BUDGET_SHARDS = budgets['shards']
+POST_SHARDS = ['default']
+POST_SHARD_DATABASES = ['posts_1', 'posts_2']
+REPLICA_DATABASES = ['replica']
+REPLICA_VIEW_MODULES = ('posts.views',)
+REPLICA_PRIMARY_APPS = ('sessions',)
+REPLICA_MAX_LAG = 30
+REPLICA_PIN_COOKIE = 'read_primary_until'
+REPLICA_PIN_SECONDS = REPLICA_MAX_LAG
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Тесты очищают кэш и пишут ключи без срока: им нужен свой файл,
+# а не кэш запущенного сервера разработки.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    CACHE_DIR = tempfile.mkdtemp(prefix='yatube-cache-')
+    atexit.register(shutil.rmtree, CACHE_DIR, True)
+else:
+    CACHE_DIR = os.path.join(BASE_DIR, 'cache')
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'default.sqlite3'),
+        'OPTIONS': {
+            'MAX_SIZE': 256 * 1024 * 1024,
+            'MAX_ENTRIES': 200000,
+        },
     }
 }